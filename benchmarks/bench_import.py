@@ -0,0 +1,90 @@
+"""Measures the startup cost of importing pyfbad.
+
+Every statement runs in a fresh interpreter, so nothing is cached between runs.
+Import time and peak RSS are written as json, ex.
+
+    python benchmarks/bench_import.py --repeat 5 --output import_times.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                        "src")
+
+STATEMENTS = [
+    "import pyfbad",
+    "from pyfbad.data.database import File",
+    "from pyfbad.models.models import IsolationForestModel",
+    "from pyfbad.data.database import File; "
+    "from pyfbad.models.models import IsolationForestModel",
+    "from pyfbad.features.create_feature import Features",
+    "from pyfbad.notification import notifications",
+    "from pyfbad.visualization import visualizations",
+]
+
+CHILD = """
+import resource, sys, time
+start = time.perf_counter()
+exec({statement!r})
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(seconds, rss, len(sys.modules))
+"""
+
+
+def measure(statement, repeat):
+    """Imports the statement in new interpreters and returns its median
+    timings.
+    Args:
+        statement (str): import statement to measure
+        repeat (int): number of interpreters started
+    Returns:
+        result (dict): median seconds, peak rss in kilobytes and loaded
+            module number
+    """
+    env = dict(os.environ)
+    paths = [SRC_PATH, env.get("PYTHONPATH")]
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, paths))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD.format(statement=statement)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        runs.append((float(output[0]), int(output[1]), int(output[2])))
+    return {
+        "statement": statement,
+        "seconds": statistics.median(run[0] for run in runs),
+        "max_rss_kb": statistics.median(run[1] for run in runs),
+        "modules": runs[-1][2],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None,
+                        help="json file of the results")
+    args = parser.parse_args()
+
+    results = []
+    for statement in STATEMENTS:
+        try:
+            result = measure(statement, args.repeat)
+        except subprocess.CalledProcessError as error:
+            message = error.stderr.strip().splitlines()[-1]
+            result = {"statement": statement, "error": message}
+        results.append(result)
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"python": sys.version.split()[0], "results": results},
+                      file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
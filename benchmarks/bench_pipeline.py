@@ -0,0 +1,184 @@
+"""Benchmarks ingestion, feature building and every detector of pyfbad.
+
+Synthetic hourly and daily series of several sizes and the bundled
+notebooks/Twitter_volume_AMZN.csv are run through File.read_from_csv,
+Features.get_modeling_data and the IF, LOF, Prophet and GMM models end to end.
+Wall time (median of the repeats) and peak traced memory of every stage are
+written as json, so runs can be compared over time, ex.
+
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 \
+        --output results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from pyfbad.data.database import File  # noqa: E402
+from pyfbad.features.create_feature import Features  # noqa: E402
+from pyfbad.models import models  # noqa: E402
+
+AMZN_PATH = os.path.join(ROOT_PATH, "notebooks", "Twitter_volume_AMZN.csv")
+MODELS = ["IF", "LOF", "Prophet", "GMM"]
+
+
+def make_series(size, date_type, seed=7):
+    """Generates a raw event table with daily and weekly seasonality, noise
+    and spikes.
+    Args:
+        size (int): number of buckets of the series
+        date_type (str): data time range type, daily (D) or hourly (H)
+        seed (int): random seed to provide constant results
+    Returns:
+        df (Dataframe): 'timestamp' and 'value' columns
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range("2015-01-01", periods=size, freq=date_type)
+    steps = np.arange(size)
+    period = 24 if date_type == "H" else 7
+    values = 100 + 30 * np.sin(2 * np.pi * steps / period)
+    values += rng.normal(0, 5, size)
+    spikes = rng.choice(size, max(size // 50, 1), replace=False)
+    values[spikes] *= rng.uniform(2, 4, len(spikes))
+    return pd.DataFrame({"timestamp": timestamps,
+                         "value": np.round(values).astype(int)})
+
+
+def run_model(model_name, df_model):
+    """Runs one detector end to end like the notebooks do."""
+    if model_name == "IF":
+        return models.IsolationForestModel().train_model(df_model)
+    if model_name == "LOF":
+        return models.LocalOutlierFactorModel().train_model(df_model)
+    if model_name == "Prophet":
+        model = models.ProphetModel()
+        table, results = model.get_anomalies(model.train_model(df_model))
+        return model.find_optimum_anomalies(table, results)
+    model = models.GaussianMixtureModel()
+    table, results = model.get_all_models(df_model)
+    best_model, model_data = model.find_best_model(table, results)
+    return model.train_forecast(best_model, model_data, 6)
+
+
+def measure(function, prepare, repeat):
+    """Measures a stage, prepare builds fresh inputs so in-place changes do
+    not leak.
+    Args:
+        function (callable): stage to measure, called with the output of
+            prepare
+        prepare (callable): builds the arguments of the stage
+        repeat (int): number of timed runs
+    Returns:
+        result (dict): median and min seconds, peak traced memory and output
+            rows
+    """
+    seconds = []
+    for _ in range(repeat):
+        args = prepare()
+        start = time.perf_counter()
+        output = function(*args)
+        seconds.append(time.perf_counter() - start)
+    args = prepare()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "peak_memory_mb": peak / 2 ** 20,
+        "rows_out": len(output) if hasattr(output, "__len__") else None,
+    }
+
+
+def bench_dataset(name, csv_path, date_type, model_names, repeat):
+    """Benchmarks all stages of one dataset stored as csv."""
+    file, features = File(), Features()
+    raw = file.read_from_csv("timestamp", csv_path)
+    results = []
+
+    def record(stage, function, prepare, **extra):
+        try:
+            result = measure(function, prepare, repeat)
+        except Exception as error:
+            result = {"error": "{0}: {1}".format(type(error).__name__, error)}
+        result.update({"dataset": name, "date_type": date_type,
+                       "rows_in": len(raw), "stage": stage}, **extra)
+        print(json.dumps(result))
+        results.append(result)
+
+    record("read_from_csv", file.read_from_csv,
+           lambda: ("timestamp", csv_path))
+    for model_name in model_names:
+        transformed = features.transform_data(raw, "timestamp", "value")
+        record("get_modeling_data", features.get_modeling_data,
+               lambda: (transformed.copy(), model_name, date_type),
+               model=model_name)
+        df_model = features.get_modeling_data(transformed.copy(), model_name,
+                                              date_type)
+        record("model", run_model, lambda: (model_name, df_model.copy()),
+               model=model_name)
+    return results
+
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_PATH,
+                                capture_output=True, text=True, check=True)
+        return output.stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--date-types", nargs="+", default=["H", "D"])
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-amzn", action="store_true")
+    parser.add_argument("--output", default=None,
+                        help="json file of the results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for date_type in args.date_types:
+            for size in args.sizes:
+                csv_path = os.path.join(tmp_dir, "synthetic_{0}_{1}.csv"
+                                        .format(date_type, size))
+                make_series(size, date_type).to_csv(csv_path, index=False)
+                results += bench_dataset("synthetic_{0}".format(size),
+                                         csv_path, date_type, args.models,
+                                         args.repeat)
+    if not args.skip_amzn:
+        results += bench_dataset("Twitter_volume_AMZN", AMZN_PATH, "H",
+                                 args.models, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "created_at": datetime.datetime.now().isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
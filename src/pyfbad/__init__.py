@@ -1,5 +1,19 @@
-from . import data
-from . import models
-from . import features
-from . import visualization
-from . import notification
\ No newline at end of file
+import importlib
+
+# subpackages are imported on first access, so "import pyfbad" does not load
+# heavy backends such as prophet, bigquery, plotly or yagmail
+__all__ = ["data", "models", "features", "visualization", "notification",
+           "instrumentation"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module("." + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(
+        __name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
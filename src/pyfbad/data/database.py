@@ -1,8 +1,139 @@
-from sqlalchemy import *
-from google.cloud import bigquery
-from google.oauth2 import service_account
+from contextlib import contextmanager
+from functools import partial
+from ..instrumentation.metrics import instrumented
+import csv
+import io
 import pandas as pd
-import pymongo
+import queue
+import threading
+import time
+
+
+def _get_field(document, field):
+    """ Returns a (possibly nested, dotted) field of a document or None. """
+    for key in field.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(key)
+    return document
+
+
+def _document_chunks(cursor, batch_size):
+    """ Yields the documents of a cursor as dataframes of batch_size rows. """
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield pd.json_normalize(batch)
+            batch = []
+    if batch:
+        yield pd.json_normalize(batch)
+
+
+def _field_chunks(cursor, fields, batch_size):
+    """ Same as _document_chunks, but only the given fields are kept. """
+    columns = {field: [] for field in fields}
+    size = 0
+    for document in cursor:
+        for field in fields:
+            columns[field].append(_get_field(document, field))
+        size += 1
+        if size == batch_size:
+            yield pd.DataFrame(columns)
+            columns = {field: [] for field in fields}
+            size = 0
+    if size:
+        yield pd.DataFrame(columns)
+
+
+def _filter_rows(df, filter):
+    """ Returns the rows whose filter[0] column equals filter[1], all rows
+    without filter.
+    """
+    if not filter:
+        return df
+    return df[df[filter[0]] == filter[1]].reset_index(drop=True)
+
+
+def _anomaly_rows(data, anomalies_only):
+    """ Returns the anomalous rows of results when anomalies_only is set. """
+    if not anomalies_only:
+        return data
+    compact = data[data['anomaly'] == 1]
+    compact.attrs = dict(data.attrs)
+    return compact
+
+
+def _bucket_stages(value):
+    """ Aggregation stages that sum the documents into time buckets. """
+    unit = {'hourly': 'hour', 'daily': 'day'}[value['date_type']]
+    date_trunc = {"date": '$' + value['column_name'], "unit": unit}
+    if 'timezone' in value:
+        date_trunc["timezone"] = value['timezone']
+    total = 1
+    if 'value_column' in value:
+        total = '$' + value['value_column']
+    return [
+        {"$group": {"_id": {"$dateTrunc": date_trunc}, "y": {"$sum": total}}},
+        {"$project": {"_id": 0, "ds": "$_id", "y": 1}},
+        {"$sort": {"ds": 1}}
+    ]
+
+
+def _put(batches, stop, item):
+    """ Puts an item into the queue unless the reading was stopped. """
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _read_stream(read_client, session, stream_name, batches, stop, done):
+    """ Puts the arrow pages of one stream into the queue, then done. """
+    try:
+        rows = read_client.read_rows(stream_name).rows(session)
+        for page in rows.pages:
+            if stop.is_set():
+                return
+            _put(batches, stop, page.to_arrow())
+    except Exception as error:
+        _put(batches, stop, error)
+    finally:
+        _put(batches, stop, done)
+
+
+def _read_streams(read_client, session):
+    """ Reads the streams of a read session in threads and yields their arrow
+    record batches as they arrive.
+    """
+    batches = queue.Queue(maxsize=2 * len(session.streams))
+    stop = threading.Event()
+    done = object()
+    threads = [threading.Thread(target=_read_stream,
+                                args=(read_client, session, stream.name,
+                                      batches, stop, done),
+                                daemon=True)
+               for stream in session.streams]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            item = batches.get()
+            if item is done:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise Exception(
+                    "Something went wrong when reading the BigQuery "
+                    "table...") from item
+            else:
+                yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
 
 
 class MongoDB:
@@ -29,6 +160,8 @@ class MongoDB:
             'db_port': self._db_port,
         }
         try:
+            import pymongo
+
             print("mongo init...")
             client = pymongo.MongoClient(
                 _config['db_path'], _config['db_port'])
@@ -108,7 +241,9 @@ class MongoDB:
         except:
             print("Something went wrong when get the data from the collection.")
 
-    def get_data_as_df(self, database, collection, filter=None):
+    @instrumented("read")
+    def get_data_as_df(self, database, collection, filter=None, fields=None,
+                       batch_size=None):
         """ Reads data from database given a collection name.
         If necessary, filter option takes a list of dictionary. add_filter method
         should be used to build.
@@ -116,25 +251,82 @@ class MongoDB:
             collection (str): name of the collection in database
             database (MongoClient): Database client object to read from
             filter (list(dict)): Should be build with add_filet method first
+            fields (list(str)): Field names to read ex. ['date', 'count'],
+                optional. Nested fields can be given with dots and keep their
+                dotted names.
+            batch_size (int): Number of documents pulled from the cursor at
+                once, optional
         Returns:
             records (df): A dataframe to the selected documents
         """
         try:
-            collection = database[collection]
-            if filter is None:
-                data = collection.find()
-            else:
-                data = collection.aggregate(filter)
-            records = pd.json_normalize(list(data))
-            return records
+            if fields is None and batch_size is None:
+                collection = database[collection]
+                if filter is None:
+                    data = collection.find()
+                else:
+                    data = collection.aggregate(filter)
+                return pd.json_normalize(list(data))
+            chunks = list(self.get_data_in_chunks(
+                database, collection, filter, fields, batch_size or 10000))
+            if not chunks:
+                return pd.DataFrame(columns=fields)
+            return pd.concat(chunks, ignore_index=True)
         except:
             print("Something went wrong when get the dataframe from the collection.")
 
+    def get_data_in_chunks(self, database, collection, filter=None,
+                           fields=None, batch_size=10000):
+        """ Reads data from database as a stream of dataframes.
+        The cursor is pulled in batches and only the given fields are read from
+        the database, so the whole collection is never held as a list of dicts.
+        Args:
+            collection (str): name of the collection in database
+            database (MongoClient): Database client object to read from
+            filter (list(dict)): Should be build with add_filet method first
+            fields (list(str)): Field names to read ex. ['date', 'count'],
+                optional. Nested fields can be given with dots and keep their
+                dotted names.
+            batch_size (int): Number of documents in each cursor batch and
+                chunk
+        Yields:
+            chunk (df): A dataframe with at most batch_size documents
+        """
+        cursor = self._open_cursor(database[collection], filter, fields,
+                                   batch_size)
+        try:
+            if fields is None:
+                yield from _document_chunks(cursor, batch_size)
+            else:
+                yield from _field_chunks(cursor, fields, batch_size)
+        finally:
+            cursor.close()
+
+    def _open_cursor(self, collection, filter, fields, batch_size):
+        """ Opens a batched cursor that only reads the given fields. """
+        projection = None
+        if fields is not None:
+            projection = {field: 1 for field in fields}
+            projection['_id'] = 1 if '_id' in fields else 0
+        if filter is None:
+            return collection.find({}, projection).batch_size(batch_size)
+        pipeline = list(filter)
+        if projection is not None:
+            pipeline.append({"$project": projection})
+        return collection.aggregate(pipeline, batchSize=batch_size)
+
     def add_filter(self, filter_array, type, value):
-        """ Add filter to mongodb query in time, value, group and sort domains.
+        """ Add filter to mongodb query in time, value, group, sort and bucket
+        domains. The bucket type sums documents into hourly or daily buckets on
+        the server (MongoDB 5.0+, the column should be stored as a date), so
+        the result has one document per bucket with 'ds' and 'y' fields. Ex.
+            add_filter([], 'bucket', {"column_name": "date",
+                                      "date_type": "hourly",
+                                      "value_column": "count"})
+        value_column is optional, documents are counted when it is not given.
         Args:
             filter_array (list): An array that contains the filter dictionaries.
-            type (str): Filter type ex. time, value, group or sort.
+            type (str): Filter type ex. time, value, group, sort or bucket.
             value (dict): Should be consist with the type of the filter. Ex.
                 add_filter(
                     [],
@@ -150,14 +342,7 @@ class MongoDB:
             filter_array (list(dict)): A list of dictionaries that contains the filter .
         """
         if type == 'time':
-            if value["date_type"] == 'hourly':
-                date_format = '%Y-%m-%d %T'
-                filter = {
-                    "$match": {value['column_name']: {'$gte': value['start_time'], '$lte': value['finish_time']}}
-                }
-                filter_array.append(filter)
-            elif value["date_type"] == 'daily':
-                date_format = '%Y-%m-%d 00:00:00'
+            if value["date_type"] in ['hourly', 'daily']:
                 filter = {
                     "$match": {value['column_name']: {'$gte': value['start_time'], '$lte': value['finish_time']}}
                 }
@@ -183,20 +368,54 @@ class MongoDB:
                 "$sort": {value['column_name']: value['desc']}
             }
             filter_array.append(filter)
+        elif type == 'bucket':
+            filter_array.extend(_bucket_stages(value))
         else:
             print(
                 "Something went wrong when build the mongodb query. Please check your input variables.")
         return filter_array
 
-    def writing_to_db(self, database, transformed, collection):
+    @instrumented("write")
+    def writing_to_db(self, database, transformed, collection,
+                      batch_size=10000, ordered=False, upsert_keys=None,
+                      anomalies_only=False):
         """ Writing detected anomalies to mongodb collections.
+        Rows are converted and sent in batches with unordered bulk writes.
         Args:
             database (database) : mongodb database
             transformed (DataFrame): Contains the data we processed
             collection (str): Name of the destination collection
-        Returns: None
+            batch_size (int): Number of documents in each bulk write
+            ordered (bool): Stop at the first failed document when True
+            upsert_keys (list(str)): Key columns ex. ['series', 'ds'],
+                optional. When given, documents are upserted on these keys, so
+                writing an overlapping window again does not create duplicates.
+            anomalies_only (bool): write only the rows flagged as anomaly
+        Returns:
+            counts (dict): inserted, upserted and modified document numbers
         """
-        database[collection].insert_many(transformed.to_dict("records"))
+        import pymongo
+
+        transformed = _anomaly_rows(transformed, anomalies_only)
+
+        counts = {'inserted': 0, 'upserted': 0, 'modified': 0}
+        for start in range(0, len(transformed), batch_size):
+            rows = transformed.iloc[start:start + batch_size]
+            batch = rows.to_dict("records")
+            if upsert_keys is None:
+                requests = [pymongo.InsertOne(document) for document in batch]
+            else:
+                requests = [
+                    pymongo.UpdateOne(
+                        {key: document[key] for key in upsert_keys},
+                        {'$set': document}, upsert=True)
+                    for document in batch
+                ]
+            result = database[collection].bulk_write(requests, ordered=ordered)
+            counts['inserted'] += result.inserted_count
+            counts['upserted'] += result.upserted_count
+            counts['modified'] += result.modified_count
+        return counts
 
 
 class SQLDB:
@@ -204,6 +423,14 @@ class SQLDB:
     def __init__(self, **kwargs):
         """ Get the connection configuration for database with kwargs.
         Args:
+            db, username, password, host, port, database: connection parameters
+            pool_size (int): number of connections kept open in the pool,
+                default 5
+            max_overflow (int): connections allowed above pool_size, default 10
+            pool_pre_ping (bool): test connections before handing them out,
+                default True
+            pool_recycle (int): seconds after which connections are renewed,
+                default 3600
         Returns: None
         """
         try:
@@ -213,8 +440,16 @@ class SQLDB:
             self.host = kwargs.get('host')
             self.port = kwargs.get('port')
             self.database = kwargs.get('database')
-        except Exception:
-            raise Exception("Error when getting configurations with kwargs...")
+            self.pool_size = kwargs.get('pool_size', 5)
+            self.max_overflow = kwargs.get('max_overflow', 10)
+            self.pool_pre_ping = kwargs.get('pool_pre_ping', True)
+            self.pool_recycle = kwargs.get('pool_recycle', 3600)
+            self._engine = None
+            self._pool_checkouts = 0
+            self._pool_connects = 0
+        except Exception as error:
+            raise Exception(
+                "Error when getting configurations with kwargs...") from error
 
     def set_db_conn(self):
         """ Set a connection configuration for database.
@@ -230,22 +465,102 @@ class SQLDB:
                 self.host,
                 self.port,
                 self.database)
-        except Exception:
-            raise Exception("Error when setting db connection parameters...")
+        except Exception as error:
+            raise Exception(
+                "Error when setting db connection parameters...") from error
+
+    def get_engine(self):
+        """ Returns the database engine, it is created once and reused.
+        Args: None
+        Returns:
+            engine (Engine): Engine instance with a connection pool
+        """
+        if self._engine is None:
+            try:
+                from sqlalchemy import create_engine, event
+
+                if not hasattr(self, 'connection_string'):
+                    self.set_db_conn()
+                print("Creating database engine...")
+                engine_kwargs = {
+                    'pool_pre_ping': self.pool_pre_ping,
+                    'pool_recycle': self.pool_recycle,
+                }
+                if not self.connection_string.startswith('sqlite'):
+                    engine_kwargs['pool_size'] = self.pool_size
+                    engine_kwargs['max_overflow'] = self.max_overflow
+                engine = create_engine(self.connection_string, **engine_kwargs)
+                event.listen(engine, 'connect', self._on_pool_connect)
+                event.listen(engine, 'checkout', self._on_pool_checkout)
+                self._engine = engine
+            except Exception as error:
+                raise Exception(
+                    "Error when creating database engine...") from error
+        return self._engine
+
+    def _on_pool_connect(self, dbapi_connection, connection_record):
+        self._pool_connects += 1
+
+    def _on_pool_checkout(self, dbapi_connection, connection_record,
+                          connection_proxy):
+        self._pool_checkouts += 1
 
     def create_db_conn(self):
-        """ Create database engine to connect database.
+        """ Create database connection from the pooled engine.
+        Closing the connection returns it to the pool.
         Args: None
         Returns:
-            engine (Database instance): Engine instance
+            connection (Database instance): Connection instance
         """
         try:
             print("Creating database connection...")
-            engine = create_engine(self.connection_string)
-            return engine.connect()
-        except Exception:
-            raise Exception("Error when creating database connection...")
+            return self.get_engine().connect()
+        except Exception as error:
+            raise Exception(
+                "Error when creating database connection...") from error
 
+    @contextmanager
+    def connection(self):
+        """ Context manager that hands out a pooled connection and returns it
+        to the pool.
+        Args: None
+        Yields:
+            connection (Database instance): Connection instance
+        """
+        db_conn = self.create_db_conn()
+        try:
+            yield db_conn
+        finally:
+            db_conn.close()
+
+    def pool_stats(self):
+        """ Returns connection pool counters.
+        A hit is a checkout served by an already open connection, a miss opens
+        a new one.
+        Args: None
+        Returns:
+            stats (dict): checkouts, hits, misses and the pool status text
+        """
+        status = None
+        if self._engine is not None:
+            status = self._engine.pool.status()
+        return {
+            'checkouts': self._pool_checkouts,
+            'hits': self._pool_checkouts - self._pool_connects,
+            'misses': self._pool_connects,
+            'status': status,
+        }
+
+    def dispose(self):
+        """ Closes all pooled connections of the engine.
+        Args: None
+        Returns: None
+        """
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+
+    @instrumented("read")
     def reading_rawdata(self, query, db_conn, table_name):
         """ Reading row data from db with sql query.
         Args: 
@@ -257,12 +572,42 @@ class SQLDB:
         try:
             print("Reading data from {0}...".format(table_name))
             return pd.read_sql_query(query, db_conn)
-        except Exception:
-            raise Exception("Error when reading rawdata...")
+        except Exception as error:
+            raise Exception("Error when reading rawdata...") from error
+        finally:
+            db_conn.close()
+
+    def reading_rawdata_in_chunks(self, query, db_conn, table_name,
+                                  chunksize=100000, dtype=None):
+        """ Reading row data from db with sql query as a stream of dataframes.
+        A server-side cursor is used when the driver supports it, so rows are
+        fetched while the previous chunk is processed.
+        Args:
+            query (str): Database username
+            db_conn (Database instance): Engine instance
+            table_name (str): database table name for dataframe
+            chunksize (integer): number of rows in each chunk
+            dtype (dict): column name vs data type of the chunks, optional
+        Yields:
+            data (DataFrame): A dataframe with at most chunksize rows
+        """
+        try:
+            print("Reading data from {0} in chunks...".format(table_name))
+            stream_conn = db_conn.execution_options(stream_results=True)
+            for chunk in pd.read_sql_query(query, stream_conn,
+                                           chunksize=chunksize, dtype=dtype):
+                yield chunk
+        except Exception as error:
+            raise Exception(
+                "Error when reading rawdata in chunks...") from error
         finally:
             db_conn.close()
 
-    def writing_to_db(self, data, db_conn, table_name, chunksize=10000, if_exists="append"):
+    @instrumented("write")
+    def writing_to_db(self, data, db_conn, table_name, chunksize=10000,
+                      if_exists="append", method=None,
+                      upsert_keys=('series', 'ds'), anomalies_only=False,
+                      index=None):
         """ Writing detected anomalies to database table.
         Args:
             data (DataFrame): DataFrame that be written to database.
@@ -270,18 +615,140 @@ class SQLDB:
             table_name (str): database table name for dataframe
             chunksize (integer): number of rows in each batch to be written.
             if_exists (str): appending new values to existing db table
-        Returns: None
+            method (str): write strategy, optional
+                None: row by row parameter binding (default)
+                'multi': multi-row INSERT ... VALUES statements
+                'copy': PostgreSQL COPY FROM STDIN from an in-memory csv
+                    buffer, needs psycopg2 or psycopg 3, other dialects raise
+                    ValueError
+                'upsert': INSERT ... ON CONFLICT DO UPDATE (PostgreSQL,
+                    SQLite) or ON DUPLICATE KEY UPDATE (MySQL). A unique
+                    index on upsert_keys is created when the table has no
+                    unique key on them. On MySQL text keys can not be
+                    indexed, create the table with a unique key first.
+            upsert_keys (tuple): key columns of the upsert strategy
+            anomalies_only (bool): write only the rows flagged as anomaly
+            index (bool): write the dataframe index as a column, by default
+                only for the row by row method
+        Returns:
+            stats (dict): number of written rows, seconds and rows per second
         """
+        if method == 'copy' and db_conn.dialect.name != 'postgresql':
+            db_conn.close()
+            raise ValueError("COPY is not supported for {0}".format(
+                db_conn.dialect.name))
         try:
+            data = _anomaly_rows(data, anomalies_only)
             print("Writing data to {0}...".format(table_name))
-            data.to_sql(name=table_name, con=db_conn,
-                        chunksize=chunksize, if_exists=if_exists)
-        except Exception:
-            raise Exception("Error when writing data to table...")
+            if index is None:
+                index = method is None
+            insert_method = method
+            if method == 'multi' and db_conn.dialect.name == 'sqlite':
+                # sqlite limits the number of bound parameters of a statement
+                columns = len(data.columns) + int(index)
+                chunksize = max(1, min(chunksize, 999 // max(columns, 1)))
+            elif method == 'copy':
+                insert_method = _copy_insert
+            elif method == 'upsert':
+                insert_method = partial(_upsert_insert,
+                                        keys_=list(upsert_keys))
+            start = time.perf_counter()
+            if method == 'upsert':
+                # the table has to exist with a unique key before the insert
+                data.head(0).to_sql(name=table_name, con=db_conn,
+                                    if_exists=if_exists, index=index)
+                _ensure_unique_key(db_conn, table_name, list(upsert_keys))
+                if_exists = 'append'
+            data.to_sql(name=table_name, con=db_conn, chunksize=chunksize,
+                        if_exists=if_exists, method=insert_method,
+                        index=index)
+            seconds = time.perf_counter() - start
+            rate = len(data) / seconds if seconds > 0 else float('inf')
+            stats = {
+                'rows': len(data),
+                'seconds': seconds,
+                'rows_per_second': rate,
+            }
+            return stats
+        except Exception as error:
+            raise Exception("Error when writing data to table...") from error
         finally:
             db_conn.close()
 
 
+def _copy_insert(pd_table, conn, keys, data_iter):
+    """ pandas to_sql method that loads rows with PostgreSQL COPY FROM STDIN.
+    Works with the psycopg2 and the psycopg 3 drivers.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(data_iter)
+    buffer.seek(0)
+    columns = ', '.join('"{0}"'.format(key) for key in keys)
+    if pd_table.schema:
+        table = '"{0}"."{1}"'.format(pd_table.schema, pd_table.name)
+    else:
+        table = '"{0}"'.format(pd_table.name)
+    sql = 'COPY {0} ({1}) FROM STDIN WITH CSV'.format(table, columns)
+    with conn.connection.cursor() as cursor:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql=sql, file=buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def _ensure_unique_key(db_conn, table_name, keys):
+    """ Creates a unique index on keys unless the table already has one. """
+    from sqlalchemy import Index, MetaData, Table, inspect
+
+    inspector = inspect(db_conn)
+    columns = [inspector.get_pk_constraint(table_name)['constrained_columns']]
+    columns += [constraint['column_names'] for constraint
+                in inspector.get_unique_constraints(table_name)]
+    columns += [index['column_names'] for index
+                in inspector.get_indexes(table_name) if index['unique']]
+    if set(keys) not in [set(column_names or []) for column_names in columns]:
+        table = Table(table_name, MetaData(), autoload_with=db_conn)
+        name = 'ux_{0}_{1}'.format(table_name, '_'.join(keys))
+        Index(name, *[table.c[key] for key in keys], unique=True).create(
+            db_conn)
+    # end the transaction the inspection started, so to_sql commits its rows
+    if db_conn.in_transaction():
+        db_conn.commit()
+
+
+def _upsert_insert(pd_table, conn, keys, data_iter, keys_):
+    """ to_sql method that inserts rows or updates them on key conflict. """
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        statement = dialect_insert(pd_table.table).values(rows)
+        update = {key: statement.inserted[key]
+                  for key in keys if key not in keys_}
+        if not update:
+            # MySQL needs at least one assignment, a key onto itself is a
+            # no-op update
+            update = {keys_[0]: statement.inserted[keys_[0]]}
+        statement = statement.on_duplicate_key_update(**update)
+        return conn.execute(statement).rowcount
+    else:
+        raise ValueError("Upsert is not supported for {0}".format(dialect))
+    statement = dialect_insert(pd_table.table).values(rows)
+    update = {key: statement.excluded[key]
+              for key in keys if key not in keys_}
+    if update:
+        statement = statement.on_conflict_do_update(index_elements=keys_,
+                                                    set_=update)
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=keys_)
+    return conn.execute(statement).rowcount
+
+
 class CloudDB:
 
     def __init__(self, key_path, project_name):
@@ -291,6 +758,9 @@ class CloudDB:
             project_name (str): Contains BigQuery project name
         """
         try:
+            from google.cloud import bigquery
+            from google.oauth2 import service_account
+
             self.key_path = key_path
             self.project_name = project_name
             self.credentials = service_account.Credentials.from_service_account_file(
@@ -301,32 +771,130 @@ class CloudDB:
                 credentials=self.credentials,
                 project=self.credentials.project_id,
             )
-        except Exception:
+        except Exception as error:
             raise Exception(
-                "Error when setting GCP BigQuery configurations...")
+                "Error when setting GCP BigQuery configurations...") from error
+
+    def get_read_client(self):
+        """ Returns the BigQuery Storage Read API client, it is created once
+        and reused.
+        Returns:
+            read_client (BigQueryReadClient): Storage Read API client
+        """
+        if getattr(self, '_read_client', None) is None:
+            from google.cloud import bigquery_storage
+
+            self._read_client = bigquery_storage.BigQueryReadClient(
+                credentials=self.credentials)
+        return self._read_client
 
-    def reading_raw_data(self, query_string):
+    @instrumented("read")
+    def reading_raw_data(self, query_string, use_storage_api=True):
         """ Reading raw data from BigQuery.
         Args:
             query_string (str): It cantains the query
+            use_storage_api (bool): download the results with the Storage Read
+                API as arrow record batches instead of REST pages
         Returns: Dataframe
         """
         try:
-            return self.bqclient.query(query_string).result().to_dataframe()
-        except Exception:
+            result = self.bqclient.query(query_string).result()
+            if use_storage_api:
+                return result.to_dataframe(
+                    bqstorage_client=self.get_read_client())
+            return result.to_dataframe(create_bqstorage_client=False)
+        except Exception as error:
+            raise Exception(
+                "Something went wrong when reading raw data to data frame..."
+            ) from error
+
+    def reading_raw_data_in_batches(self, query_string, use_storage_api=True):
+        """ Reading raw data from BigQuery as a stream of dataframes.
+        Args:
+            query_string (str): It cantains the query
+            use_storage_api (bool): download the results with the Storage Read
+                API as arrow record batches instead of REST pages
+        Yields:
+            data (DataFrame): A dataframe of each downloaded batch
+        """
+        try:
+            result = self.bqclient.query(query_string).result()
+            read_client = self.get_read_client() if use_storage_api else None
+            batches = result.to_dataframe_iterable(
+                bqstorage_client=read_client)
+            for batch in batches:
+                yield batch
+        except Exception as error:
+            raise Exception(
+                "Something went wrong when reading raw data in batches..."
+            ) from error
+
+    def reading_table_in_batches(self, dataset, table_name, columns=None,
+                                 row_filter=None, max_streams=4,
+                                 as_arrow=False, read_client=None):
+        """ Reading a table with the Storage Read API in parallel streams.
+        Only the given columns and the rows matching row_filter are sent by the
+        server. Every stream is read by its own thread and the record batches
+        are yielded as they arrive, so their order is not kept.
+        Args:
+            dataset (str): Contains BigQuery dataset name
+            table_name (str): Contains BigQuery table name
+            columns (list): columns to read, all columns when not given
+            row_filter (str): SQL condition of the rows ex. "country = 'TR'",
+                optional
+            max_streams (int): maximum number of streams read in parallel
+            as_arrow (bool): yield arrow record batches instead of dataframes
+            read_client (BigQueryReadClient): Storage Read API client,
+                get_read_client when not given
+        Yields:
+            data (DataFrame or RecordBatch): A batch of rows
+        """
+        from google.cloud.bigquery_storage import types
+
+        read_client = read_client or self.get_read_client()
+        requested_session = types.ReadSession(
+            table="projects/{0}/datasets/{1}/tables/{2}".format(
+                self.project_name, dataset, table_name),
+            data_format=types.DataFormat.ARROW,
+            read_options=types.ReadSession.TableReadOptions(
+                selected_fields=columns or [],
+                row_restriction=row_filter or ""),
+        )
+        try:
+            session = read_client.create_read_session(
+                parent="projects/{0}".format(self.bqclient.project),
+                read_session=requested_session,
+                max_stream_count=max_streams,
+            )
+        except Exception as error:
             raise Exception(
-                "Something went wrong when reading raw data to data frame...")
+                "Something went wrong when creating the BigQuery "
+                "read session..."
+            ) from error
+        if not session.streams:
+            return
+
+        batches = _read_streams(read_client, session)
+        try:
+            for batch in batches:
+                yield batch if as_arrow else batch.to_pandas()
+        finally:
+            batches.close()
 
-    def writing_to_bq(self, dataframe, dataset, table_name):
+    @instrumented("write")
+    def writing_to_bq(self, dataframe, dataset, table_name,
+                      anomalies_only=False):
         """It writes dataframe to bq, If table is exist it adds inside of it, else it
             creates table first.
         Args:
             dataframe (DataFrame): Contains the values we want to write to bq
             dataset (str): Contains BigQuery dataset name
             table_name (str): Contains BigQuery table name
+            anomalies_only (bool): write only the rows flagged as anomaly
         Returns: If result is succeeded empty list will return
         """
         try:
+            dataframe = _anomaly_rows(dataframe, anomalies_only)
             print("Writing data to {0}...".format(table_name))
             table_id = "{0}.{1}.{2}".format(
                 self.project_name, dataset, table_name)
@@ -334,9 +902,10 @@ class CloudDB:
                 dataframe, table_id
             )
             return job.result()
-        except Exception:
+        except Exception as error:
             raise Exception(
-                "Something went wrong when writing  data to BigQuery table...")
+                "Something went wrong when writing  data to BigQuery table..."
+            ) from error
 
 
 class File:
@@ -344,35 +913,169 @@ class File:
     def __init__(self) -> None:
         pass
 
-    def read_from_csv(self, time_column_name, file_path, filter=None):
+    @instrumented("read")
+    def read_from_csv(self, time_column_name, file_path, filter=None,
+                      dtype=None, date_format=None, usecols=None,
+                      chunksize=None, memory_map=False):
         """ Reads data from csv file.
         Args:
             time_column_name (str): name of the time column in dataset
             file_path (str): file path of csv file
             filter (array): column_name,value
+            dtype (dict): column name vs data type, skips type inference,
+                optional
+            date_format (str): format of the time column ex.
+                '%Y-%m-%d %H:%M:%S', optional
+            usecols (list): columns to read, optional
+            chunksize (int): read and filter the file in chunks of that many
+                rows, optional
+            memory_map (bool): map the file into memory instead of buffered
+                reads
         Returns:
             df_ (dataframe): read dataframe
         """
         try:
-            df = pd.read_csv(file_path)
-            df_ = df[df[filter[0]] == filter[1]].reset_index(
-                drop=True) if filter else df
+            if usecols is not None and filter and filter[0] not in usecols:
+                usecols = list(usecols) + [filter[0]]
+            read_kwargs = {'dtype': dtype, 'usecols': usecols,
+                           'memory_map': memory_map}
+            if chunksize:
+                reader = pd.read_csv(file_path, chunksize=chunksize,
+                                     **read_kwargs)
+                chunks = [_filter_rows(chunk, filter) for chunk in reader]
+                df_ = pd.concat(chunks, ignore_index=True)
+            else:
+                df_ = _filter_rows(pd.read_csv(file_path, **read_kwargs),
+                                   filter)
+            df_[time_column_name] = pd.to_datetime(df_[time_column_name],
+                                                   format=date_format)
+            return df_
+        except Exception as error:
+            raise Exception(
+                "Something went wrong when reading raw data from csv file..."
+            ) from error
+
+    @instrumented("read")
+    def read_from_parquet(self, time_column_name, file_path, filter=None,
+                          columns=None):
+        """ Reads data from parquet file.
+        The filter is pushed down to the row groups, so row groups that can not
+        match are skipped, and only the given columns are read.
+        Args:
+            time_column_name (str): name of the time column in dataset
+            file_path (str): file path of parquet file or directory
+            filter (array): column_name,value
+            columns (list): columns to read, optional
+        Returns:
+            df_ (dataframe): read dataframe
+        """
+        try:
+            filters = [(filter[0], '==', filter[1])] if filter else None
+            df_ = pd.read_parquet(file_path, columns=columns, filters=filters)
+            df_[time_column_name] = pd.to_datetime(df_[time_column_name])
+            return df_.reset_index(drop=True)
+        except Exception as error:
+            raise Exception(
+                "Something went wrong when reading raw data from "
+                "parquet file..."
+            ) from error
+
+    @instrumented("read")
+    def read_from_feather(self, time_column_name, file_path, filter=None,
+                          columns=None):
+        """ Reads data from feather file.
+        The file is memory mapped and the filter is applied on the arrow table
+        before the dataframe is built. Reads of uncompressed files, the
+        default of writing_to_feather, are zero-copy, compressed files are
+        decompressed into memory.
+        Args:
+            time_column_name (str): name of the time column in dataset
+            file_path (str): file path of feather file
+            filter (array): column_name,value
+            columns (list): columns to read, optional
+        Returns:
+            df_ (dataframe): read dataframe
+        """
+        try:
+            import pyarrow.compute as pc
+            import pyarrow.feather as feather
+
+            read_columns = columns
+            if columns is not None and filter and filter[0] not in columns:
+                read_columns = list(columns) + [filter[0]]
+            table = feather.read_table(
+                file_path, columns=read_columns, memory_map=True)
+            if filter:
+                table = table.filter(pc.field(filter[0]) == filter[1])
+            if columns is not None:
+                table = table.select(columns)
+            df_ = table.to_pandas()
             df_[time_column_name] = pd.to_datetime(df_[time_column_name])
             return df_
-        except Exception:
+        except Exception as error:
             raise Exception(
-                "Something went wrong when reading raw data from csv file...")
+                "Something went wrong when reading raw data from "
+                "feather file..."
+            ) from error
 
-    def writing_to_csv(self, data, file_path, index=False):
+    @instrumented("write")
+    def writing_to_csv(self, data, file_path, index=False,
+                       anomalies_only=False):
         """ Writes data to csv file.
         Args:
             data (DataFrame): dataframe that will be written to csv
             file_path (str): csv file path of dataframe to write
             index (boolean): booelan value of whether add or not index to csv
+            anomalies_only (bool): write only the rows flagged as anomaly
         Returns: None
         """
         try:
             print("Writing data to csv...")
+            data = _anomaly_rows(data, anomalies_only)
             data.to_csv(file_path, index=index)
-        except Exception:
-            raise Exception("Error when writing data to csv...")
+        except Exception as error:
+            raise Exception("Error when writing data to csv...") from error
+
+    @instrumented("write")
+    def writing_to_parquet(self, data, file_path, index=False,
+                           row_group_size=None, anomalies_only=False):
+        """ Writes data to parquet file.
+        Args:
+            data (DataFrame): dataframe that will be written to parquet
+            file_path (str): parquet file path of dataframe to write
+            index (boolean): booelan value of whether add or not index to
+                parquet
+            row_group_size (int): number of rows in each row group, smaller
+                groups let filtered reads skip more data, optional
+            anomalies_only (bool): write only the rows flagged as anomaly, the
+                attrs of compact results ex. threshold are kept in the file
+                metadata
+        Returns: None
+        """
+        try:
+            print("Writing data to parquet...")
+            data = _anomaly_rows(data, anomalies_only)
+            data.to_parquet(file_path, index=index,
+                            row_group_size=row_group_size)
+        except Exception as error:
+            raise Exception("Error when writing data to parquet...") from error
+
+    @instrumented("write")
+    def writing_to_feather(self, data, file_path, anomalies_only=False,
+                           compression='uncompressed'):
+        """ Writes data to feather file.
+        Args:
+            data (DataFrame): dataframe that will be written to feather
+            file_path (str): feather file path of dataframe to write
+            anomalies_only (bool): write only the rows flagged as anomaly
+            compression (str): 'uncompressed', 'lz4' or 'zstd'. Uncompressed
+                files can be memory mapped without copying by read_from_feather
+        Returns: None
+        """
+        try:
+            print("Writing data to feather...")
+            data = _anomaly_rows(data, anomalies_only)
+            data.reset_index(drop=True).to_feather(
+                file_path, compression=compression)
+        except Exception as error:
+            raise Exception("Error when writing data to feather...") from error
@@ -1,8 +1,124 @@
+from pandas.tseries.frequencies import to_offset
+from ..instrumentation.metrics import instrumented
+import numpy as np
+import os
 import pandas as pd
 
 
+# time feature name vs DatetimeIndex field, in the modeling data column order
+TIME_FEATURES = {
+    'hour': 'hour',
+    'day': 'day',
+    'month': 'month',
+    'quarter': 'quarter',
+    'year': 'year',
+    'day_of_year': 'dayofyear',
+    'week_of_year': None,
+    'weekday': None,
+    'is_weekday': None,
+}
+FEATURE_DTYPES = {'year': 'int16', 'day_of_year': 'int16'}
+MODEL_EXCLUDED_FEATURES = {
+    'IF': ['quarter', 'is_weekday'],
+    'LOF': ['quarter', 'is_weekday'],
+    'GMM': ['day_of_year'],
+}
+
+
+# number of segments of one level that are merged into a segment of the next
+# level, so every bucket is rewritten at most log(n) times
+CACHE_MERGE_FANOUT = 16
+_SEGMENT_TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def _cache_extension(cache_path):
+    return '.feather' if cache_path.rstrip('/').endswith('.feather') \
+        else '.parquet'
+
+
+def _read_frame(path):
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    return pd.read_parquet(path)
+
+
+def _write_frame(frame, path):
+    """ Writes a bucket file atomically. """
+    tmp_path = path + '.tmp'
+    if path.endswith('.feather'):
+        frame.reset_index(drop=True).to_feather(tmp_path)
+    else:
+        frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _list_segments(cache_path):
+    """ Returns (level, first ds, last ds, path) of the finished bucket
+    segments in time order, only file names are read.
+    """
+    if not os.path.isdir(cache_path):
+        return []
+    segments = []
+    for name in os.listdir(cache_path):
+        stem, extension = os.path.splitext(name)
+        parts = stem.split('_')
+        if extension == '.tmp' or len(parts) != 3 or parts[0][0] != 'L':
+            continue
+        first, last = (pd.Timestamp(part) for part in parts[1:])
+        segments.append((int(parts[0][1:]), first, last,
+                         os.path.join(cache_path, name)))
+    return sorted(segments, key=lambda segment: segment[1])
+
+
+def _segment_time(value):
+    """ Formats a bucket time for a segment file name, timezone aware times
+    are written in UTC with a Z suffix so they parse back aware.
+    """
+    if value.tzinfo is not None:
+        return value.tz_convert('UTC').strftime(_SEGMENT_TIME_FORMAT) + 'Z'
+    return value.strftime(_SEGMENT_TIME_FORMAT)
+
+
+def _segment_path(cache_path, level, frame):
+    return os.path.join(cache_path, 'L{0}_{1}_{2}{3}'.format(
+        level, _segment_time(frame['ds'].iloc[0]),
+        _segment_time(frame['ds'].iloc[-1]), _cache_extension(cache_path)))
+
+
+def _append_buckets(cache_path, finished):
+    """ Appends finished buckets as a new segment file. Once a level holds
+    CACHE_MERGE_FANOUT segments they are merged into one segment of the next
+    level, the existing segments are never rewritten on a plain append.
+    """
+    _write_frame(finished, _segment_path(cache_path, 0, finished))
+    level = 0
+    while True:
+        paths = [path for segment_level, _, _, path
+                 in _list_segments(cache_path) if segment_level == level]
+        if len(paths) < CACHE_MERGE_FANOUT:
+            return
+        merged = pd.concat([_read_frame(path) for path in paths],
+                           ignore_index=True)
+        _write_frame(merged, _segment_path(cache_path, level + 1, merged))
+        for path in paths:
+            os.remove(path)
+        level += 1
+
+
+def _read_bucket_cache(cache_path):
+    """ Reads all finished buckets, None when there are none yet. """
+    segments = _list_segments(cache_path)
+    if not segments:
+        return None
+    cache = pd.concat([_read_frame(path) for _, _, _, path in segments],
+                      ignore_index=True)
+    # an interrupted merge can leave a bucket in two segments
+    return cache.drop_duplicates('ds', keep='last').reset_index(drop=True)
+
+
 class Features:
 
+    @instrumented("transform")
     def transform_data(self, df, time_column_name, value_column_name, filter=None):
         """ Returns a two column dataframe ready to use train model.
         Args:
@@ -21,61 +137,193 @@ class Features:
             return df_[columns] \
                 .rename(columns={time_column_name: 'ds', value_column_name: 'y'}) \
                 .sort_values('ds', ascending=True)
-        except Exception:
+        except Exception as error:
             raise Exception(
-                "Error when cleaning dataframe to extract features...")
+                "Error when cleaning dataframe to extract features..."
+            ) from error
+
+    @instrumented("resample")
+    def aggregate_chunks(self, chunks, time_column_name, value_column_name,
+                         date_type="D", filter=None):
+        """ Folds a stream of raw dataframes into a two column time series.
+        Each chunk is summed into hourly or daily buckets and merged into the
+        running result, so memory depends on the number of buckets only.
+        Args:
+            chunks (iterable): Dataframes ex. from
+                SQLDB.reading_rawdata_in_chunks
+            time_column_name (str): The column name will be defined time axis
+            value_column_name (str): The column name will be used as main data
+                to train
+            date_type (str): data time range type, daily or hourly
+            filter (list): To takes only this "value" from the "column_name"
+                --> ['country','TR']
+        Returns:
+            df_ (Dataframe): Two column dataframe ready to use
+                get_modeling_data
+        """
+        try:
+            totals = None
+            for chunk in chunks:
+                if filter is not None:
+                    chunk = chunk[chunk[filter[0]] == filter[1]]
+                times = pd.to_datetime(chunk[time_column_name])
+                buckets = times.dt.floor(date_type).values
+                partial = chunk[value_column_name].groupby(buckets).sum()
+                if totals is None:
+                    totals = partial
+                else:
+                    totals = totals.add(partial, fill_value=0)
+            if totals is None:
+                return pd.DataFrame(columns=['ds', 'y'])
+            totals = totals.sort_index().rename_axis('ds').rename('y')
+            return totals.reset_index()
+        except Exception as error:
+            raise Exception("Error when aggregating data chunks...") from error
 
-    def extract_time_features(self, df_):
+    @instrumented("feature_extraction")
+    def extract_time_features(self, df_, features=None):
         """ Create extra features from date value in dataframe.
         Args:
             df_ (Dataframe): A dataframe contains a bunch of column
+            features (list): Names of the features to create, all of
+                TIME_FEATURES except hour when not given
         Returns:
             df_ (Dataframe): A dataframe that contains extra time features
         """
         try:
+            if features is None:
+                features = [f for f in TIME_FEATURES if f != 'hour']
+            index = df_.index
             # create features from date
-            df_['day'] = [i.day for i in df_.index]
-            df_['month'] = [i.month for i in df_.index]
-            df_['quarter'] = [i.quarter for i in df_.index]
-            df_['year'] = [i.year for i in df_.index]
-            df_['day_of_year'] = [i.dayofyear for i in df_.index]
-            df_['week_of_year'] = [i.weekofyear for i in df_.index]
-            df_['weekday'] = [i.isoweekday() for i in df_.index]
-            df_["is_weekday"] = df_['weekday'].apply(
-                lambda x: 0 if (x == 6) | (x == 7) else 1)
+            for name in TIME_FEATURES:
+                if name not in features:
+                    continue
+                if name == 'week_of_year':
+                    values = index.isocalendar().week.to_numpy()
+                elif name == 'weekday':
+                    values = index.dayofweek + 1
+                elif name == 'is_weekday':
+                    values = index.dayofweek < 5
+                else:
+                    values = getattr(index, TIME_FEATURES[name])
+                dtype = FEATURE_DTYPES.get(name, 'int8')
+                df_[name] = np.asarray(values).astype(dtype)
             return df_
-        except Exception:
-            raise Exception("Error when extracting feature from dataframe...")
+        except Exception as error:
+            raise Exception(
+                "Error when extracting feature from dataframe...") from error
 
-    def get_modeling_data(self, df_model, model_name, date_type="D"):
+    def get_resample_watermark(self, cache_path, date_type="D", tz=None):
+        """ Returns the time new raw rows should be read from.
+        Args:
+            cache_path (str): directory of the finished bucket segments
+            date_type (str): data time range type, daily or hourly
+            tz (str or tzinfo): timezone of the raw 'ds' values, optional.
+                Buckets of timezone aware data are returned in it
+        Returns:
+            watermark (Timestamp): start of the first bucket that is not
+                finished, None without cache
+        """
+        segments = _list_segments(cache_path)
+        if not segments:
+            return None
+        freq = 'H' if date_type == "H" else 'D'
+        last = max(last for _, _, last, _ in segments)
+        if last.tzinfo is not None and tz is not None:
+            last = last.tz_convert(tz)
+        return last + to_offset(freq)
+
+    @instrumented("resample")
+    def resample_incremental(self, df_model, cache_path, date_type="D"):
+        """ Resamples a two column dataframe using a persisted store of
+        finished buckets.
+        Only raw rows from get_resample_watermark on are resampled, older
+        rows are already in the store and ignored. Newly finished buckets
+        are appended to the store as a new Parquet or Feather segment, the
+        trailing bucket is treated as still open and kept in a separate
+        small file until a later bucket exists.
+        Args:
+            df_model (Dataframe): Two column dataframe with 'ds' and 'y',
+                new raw rows
+            cache_path (str): directory of the bucket segments, Feather
+                segments when it ends with .feather, Parquet otherwise
+            date_type (str): data time range type, daily or hourly
+        Returns:
+            df_model (Dataframe): Full resampled 'ds', 'y' dataframe
+        """
+        try:
+            freq = 'H' if date_type == "H" else 'D'
+            os.makedirs(cache_path, exist_ok=True)
+            open_path = os.path.join(
+                cache_path, 'open' + _cache_extension(cache_path))
+            tz = getattr(df_model['ds'].dtype, 'tz', None)
+            watermark = self.get_resample_watermark(cache_path, date_type, tz)
+            if watermark is not None:
+                df_model = df_model[df_model['ds'] >= watermark]
+            buckets = df_model.set_index('ds')['y'].resample(freq).sum()
+            if watermark is not None and not buckets.empty:
+                buckets = buckets.reindex(
+                    pd.date_range(watermark, buckets.index.max(), freq=freq),
+                    fill_value=0)
+            buckets = buckets.rename_axis('ds').reset_index()
+            if buckets.empty:
+                # no new rows, the open bucket of the last run stays as it is
+                if os.path.exists(open_path):
+                    buckets = _read_frame(open_path)
+            else:
+                if len(buckets) > 1:
+                    _append_buckets(cache_path, buckets.iloc[:-1])
+                _write_frame(buckets.iloc[-1:], open_path)
+            cache = _read_bucket_cache(cache_path)
+            frames = [frame for frame in [cache, buckets.iloc[-1:]]
+                      if frame is not None]
+            return pd.concat(frames, ignore_index=True)
+        except Exception as error:
+            raise Exception(
+                "Error when resampling data incrementally...") from error
+
+    @instrumented("resample")
+    def resample_data(self, df_model, date_type="D"):
+        """ Sums a two column dataframe into hourly or daily buckets.
+        Args:
+            df_model (Dataframe): dataframe with 'ds' and 'y' columns
+            date_type (str): data time range type, daily or hourly
+        Returns:
+            df_model (Dataframe): resampled dataframe with 'ds' as index
+        """
+        # set timestamp to index
+        df_model.set_index('ds', inplace=True)
+        return df_model.resample('H' if date_type == "H" else 'D').sum()
+
+    def get_modeling_data(self, df_model, model_name, date_type="D",
+                          cache_path=None):
         """ Returns a dataframe with extracted time features for modeling.
         Args:
             df_model (Dataframe): dataframe ready to use train model    
             model_name (str): name of the model, IF or GMM  
             date_type (str): data time range type, daily or hourly
+            cache_path (str): directory of finished bucket segments,
+                optional. When given, df_model only needs the raw rows from
+                get_resample_watermark on, see resample_incremental
         Returns:
             df_model (Dataframe): feature extacted dataframe
         """
         try:
-            # set timestamp to index
-            df_model.set_index('ds', inplace=True)
-
-            if date_type == "H":
-                df_model = df_model.resample('H').sum()
-                df_model['hour'] = [i.hour for i in df_model.index]
+            if cache_path is not None:
+                df_model = self.resample_incremental(
+                    df_model, cache_path, date_type).set_index('ds')
             else:
-                df_model = df_model.resample('D').sum()
+                df_model = self.resample_data(df_model, date_type)
 
-            df_model = self.extract_time_features(df_model)
-
-            if model_name in ["IF", "LOF"]:
-                return df_model.drop(['quarter', 'is_weekday'], axis=1)
-            elif model_name == "GMM":
-                return df_model.drop(['day_of_year'], axis=1)
-            elif model_name == "Prophet":
+            if model_name == "Prophet":
                 return df_model.reset_index()[["ds", "y"]]
-            else:
-                return df_model
-        except Exception:
+
+            excluded = MODEL_EXCLUDED_FEATURES.get(model_name, [])
+            if date_type != "H":
+                excluded = excluded + ['hour']
+            return self.extract_time_features(
+                df_model, [f for f in TIME_FEATURES if f not in excluded])
+        except Exception as error:
             raise Exception(
-                "Error when getting dataframe ready for modeling...")
\ No newline at end of file
+                "Error when getting dataframe ready for modeling..."
+            ) from error
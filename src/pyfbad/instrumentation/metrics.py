@@ -0,0 +1,373 @@
+from contextlib import contextmanager
+import contextvars
+import functools
+import logging
+import socket
+import threading
+import time
+import tracemalloc
+
+STAGES = ["read", "transform", "resample", "feature_extraction", "fit",
+          "score", "write", "notify"]
+
+logger = logging.getLogger(__name__)
+_series = contextvars.ContextVar("pyfbad_series", default=None)
+
+
+def _count_rows(value):
+    """ Returns the row number of a dataframe, or of the first dataframe in a
+    tuple.
+    """
+    if isinstance(value, tuple):
+        value = next((v for v in value if hasattr(v, "columns")), None)
+    return len(value) if hasattr(value, "columns") else None
+
+
+class LoggingExporter:
+
+    def __init__(self, level=logging.INFO, logger_=None):
+        """ Writes every stage record to the logging module.
+        Args:
+            level (int): logging level of the records
+            logger_ (Logger): logger to write to,
+                pyfbad.instrumentation.metrics by default
+        """
+        self.level = level
+        self.logger = logger_ or logger
+
+    def export(self, record):
+        self.logger.log(
+            self.level,
+            "stage=%s name=%s series=%s seconds=%.6f rows_in=%s rows_out=%s "
+            "peak_memory_mb=%s error=%s",
+            record["stage"],
+            record["name"],
+            record["series"],
+            record["seconds"],
+            record["rows_in"],
+            record["rows_out"],
+            record["peak_memory_mb"],
+            record["error"],
+        )
+
+
+class PrometheusExporter:
+
+    def __init__(self, prefix="pyfbad"):
+        """ Aggregates stage records and renders them in Prometheus text
+        format.
+        Args:
+            prefix (str): metric name prefix
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def export(self, record):
+        key = (
+            record["stage"],
+            "" if record["series"] is None else str(record["series"]),
+        )
+        with self._lock:
+            metric = self._metrics.setdefault(
+                key,
+                {
+                    "count": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "rows_in": 0,
+                    "rows_out": 0,
+                    "peak_memory_mb": None,
+                },
+            )
+            metric["count"] += 1
+            metric["errors"] += record["error"] is not None
+            metric["seconds"] += record["seconds"]
+            metric["rows_in"] += record["rows_in"] or 0
+            metric["rows_out"] += record["rows_out"] or 0
+            if record["peak_memory_mb"] is not None:
+                metric["peak_memory_mb"] = max(
+                    metric["peak_memory_mb"] or 0, record["peak_memory_mb"]
+                )
+
+    def render(self):
+        """ Returns the aggregated metrics in Prometheus text exposition
+        format.
+        Returns:
+            text (str)
+        """
+        names = [
+            ("stage_runs_total", "count", "counter",
+             "Number of stage runs."),
+            ("stage_errors_total", "errors", "counter",
+             "Number of failed stage runs."),
+            ("stage_seconds_total", "seconds", "counter",
+             "Wall time spent in the stage."),
+            ("stage_rows_in_total", "rows_in", "counter",
+             "Rows given to the stage."),
+            ("stage_rows_out_total", "rows_out", "counter",
+             "Rows returned by the stage."),
+            ("stage_peak_memory_mb", "peak_memory_mb", "gauge",
+             "Peak traced memory of the stage."),
+        ]
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, field, metric_type, help_text in names:
+            full_name = "{0}_{1}".format(self.prefix, name)
+            lines.append("# HELP {0} {1}".format(full_name, help_text))
+            lines.append("# TYPE {0} {1}".format(full_name, metric_type))
+            for (stage, series), metric in metrics:
+                if metric[field] is None:
+                    continue
+                lines.append(
+                    '{0}{{stage="{1}",series="{2}"}} {3}'.format(
+                        full_name,
+                        stage,
+                        series.replace('"', '\\"'),
+                        metric[field],
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ Writes the metrics to a file, ex. for the node exporter textfile
+        collector.
+        Args:
+            path (str): file path of the metrics
+        Returns: None
+        """
+        with open(path, "w") as file:
+            file.write(self.render())
+
+
+class StatsDExporter:
+
+    def __init__(self, host="127.0.0.1", port=8125, prefix="pyfbad"):
+        """ Sends every stage record to a StatsD server over UDP.
+        Args:
+            host (str): StatsD host
+            port (int): StatsD port
+            prefix (str): metric name prefix
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def export(self, record):
+        name = "{0}.{1}".format(self.prefix, record["stage"])
+        if record["series"] is not None:
+            name += "." + str(record["series"]).replace(".", "_")
+        lines = [
+            "{0}.seconds:{1:.3f}|ms".format(name, record["seconds"] * 1000)
+        ]
+        if record["rows_in"] is not None:
+            lines.append("{0}.rows_in:{1}|c".format(name, record["rows_in"]))
+        if record["rows_out"] is not None:
+            lines.append("{0}.rows_out:{1}|c".format(name, record["rows_out"]))
+        if record["peak_memory_mb"] is not None:
+            lines.append(
+                "{0}.peak_memory_mb:{1:.3f}|g".format(
+                    name, record["peak_memory_mb"]
+                )
+            )
+        if record["error"] is not None:
+            lines.append("{0}.errors:1|c".format(name))
+        try:
+            self._socket.sendto("\n".join(lines).encode(), self.address)
+        except OSError:
+            logger.debug(
+                "Could not send metrics to StatsD at %s:%s", *self.address
+            )
+
+
+class Instrumentation:
+
+    def __init__(self, exporters=None, trace_memory=False, enabled=True):
+        """ Records wall time, rows in/out and peak memory of the pipeline
+        stages.
+        Args:
+            exporters (list): objects with an export(record) method
+            trace_memory (bool): trace the peak memory of the stages with
+                tracemalloc, it slows down allocation heavy code
+            enabled (bool): record nothing when False
+        """
+        self.exporters = list(exporters) if exporters is not None else []
+        self.trace_memory = trace_memory
+        self.enabled = enabled
+        self._local = threading.local()
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def series(self, key):
+        """ Labels the stages run inside the block with a series key. """
+        token = _series.set(key)
+        try:
+            yield
+        finally:
+            _series.reset(token)
+
+    @contextmanager
+    def stage(self, stage, name=None, rows_in=None):
+        """ Measures the block as a stage, rows_out can be set on the yielded
+        record.
+        Args:
+            stage (str): one of STAGES
+            name (str): name of the measured function, optional
+            rows_in (int): number of input rows, optional
+        Yields:
+            record (dict): the stage record
+        """
+        record = {
+            "stage": stage,
+            "name": name,
+            "series": _series.get(),
+            "seconds": None,
+            "rows_in": rows_in,
+            "rows_out": None,
+            "peak_memory_mb": None,
+            "error": None,
+        }
+        if not self.enabled:
+            yield record
+            return
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        tracing = self.trace_memory
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if stack:
+                # keep the peak the parent stage reached before this one
+                stack[-1] = max(stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            stack.append(0)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as error:
+            record["error"] = type(error).__name__
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if tracing:
+                # nested stages reset the peak, so their peaks are carried to
+                # the parent
+                peak = max(tracemalloc.get_traced_memory()[1], stack.pop())
+                if stack:
+                    stack[-1] = max(stack[-1], peak)
+                record["peak_memory_mb"] = peak / 2 ** 20
+            self.export(record)
+
+    def export(self, record):
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception:
+                logger.exception("Error when exporting stage metrics")
+
+    def call(self, stage, function, *args, **kwargs):
+        """ Calls a function measured as a stage.
+        The first dataframe argument and the returned dataframe are counted as
+        rows.
+        Args:
+            stage (str): one of STAGES
+            function (callable): function to call with args and kwargs
+        Returns:
+            result of the function
+        """
+        if not self.enabled:
+            return function(*args, **kwargs)
+        rows_in = next(
+            (
+                rows
+                for rows in map(_count_rows, args + tuple(kwargs.values()))
+                if rows is not None
+            ),
+            None,
+        )
+        with self.stage(stage, function.__qualname__, rows_in) as record:
+            result = function(*args, **kwargs)
+            record["rows_out"] = _count_rows(result)
+            return result
+
+    def instrument(self, stage):
+        """ Decorator that measures every call of a function as a stage of this
+        instrumentation.
+        Args:
+            stage (str): one of STAGES
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                return self.call(stage, function, *args, **kwargs)
+            return wrapper
+        return decorator
+
+
+class _ListExporter:
+
+    def __init__(self, records):
+        self.records = records
+
+    def export(self, record):
+        self.records.append(record)
+
+
+_instrumentation = Instrumentation(exporters=[LoggingExporter(logging.DEBUG)])
+
+
+def get_instrumentation():
+    """ Returns the instrumentation used by the pipeline stages. """
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation):
+    """ Replaces the instrumentation used by the pipeline stages, ex.
+        set_instrumentation(Instrumentation(
+            [LoggingExporter(), PrometheusExporter()]))
+    Args:
+        instrumentation (Instrumentation): new instrumentation
+    Returns: None
+    """
+    global _instrumentation
+    _instrumentation = instrumentation
+
+
+def instrumented(stage):
+    """ Decorator that measures a pipeline function as a stage of the current
+    instrumentation, see get_instrumentation and set_instrumentation.
+    Args:
+        stage (str): one of STAGES
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return _instrumentation.call(stage, function, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_records(trace_memory=False, enabled=True):
+    """ Replaces the current instrumentation with one that keeps the records
+    in a list instead of exporting them. Used in worker processes, whose
+    records are sent back and exported by the parent process.
+    Args:
+        trace_memory (bool): trace the peak memory of the stages
+        enabled (bool): record nothing when False
+    Yields:
+        records (list): the stage records of the block
+    """
+    global _instrumentation
+    previous = _instrumentation
+    records = []
+    _instrumentation = Instrumentation(
+        [_ListExporter(records)], trace_memory, enabled)
+    try:
+        yield records
+    finally:
+        _instrumentation = previous
@@ -1,115 +1,693 @@
-from inne import IsolationNNE
-from prophet import Prophet
-from sqlalchemy import *
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from sklearn.ensemble import IsolationForest
 from sklearn.mixture import GaussianMixture
 from sklearn.neighbors import LocalOutlierFactor
+from ..features.create_feature import Features
+from ..instrumentation.metrics import (
+    collect_records,
+    get_instrumentation,
+    instrumented,
+)
 
+import hashlib
+import joblib
+import json
+import logging
 import numpy as np
 import pandas as pd
 
 
-class IsolationForestModel:
-    def train_model(self, df_model, contamination_value=float(0.06)):
-        """Train a Isolation Forest model and make prediction with given dataframe.
+def _fit_gmm(features, cluster_number, random_state=7):
+    """Fit one candidate gmm model, module level so it can run in a process
+    pool.
+    Args:
+        features (Dataframe): feature data shared by all candidates
+        cluster_number (int): number of clusters that used in gmm model
+        random_state (int): random state value to provide constant results
+    Returns:
+        cluster_number (int), model (model) and bic value (float) of the
+        candidate
+    """
+    model = GaussianMixture(
+        n_components=cluster_number, random_state=random_state
+    )
+    model.fit(features)
+    return cluster_number, model, model.bic(features)
+
+
+MODEL_FORMAT_VERSION = 1
+
+
+def _split_model_data(df_model):
+    """Returns the model data with a 'ds' column and its feature columns.
+    Args:
+        df_model (Dataframe): dataframe ready to use train model, 'ds' as index
+            or column
+    Returns:
+        model_data (Dataframe), features (Dataframe)
+    """
+    model_data = (
+        df_model if "ds" in df_model.columns else df_model.reset_index()
+    )
+    return model_data, model_data.drop("ds", axis=1)
+
+
+def _schema_hash(features):
+    """Returns a hash of the feature names and their order.
+    Args:
+        features (Dataframe): feature columns of the model data
+    Returns:
+        schema hash (str)
+    """
+    return hashlib.sha256(
+        json.dumps(list(features.columns)).encode()
+    ).hexdigest()
+
+
+def compact_results(results, anomalies_only=False, **metadata):
+    """Returns the detector results with small dtypes and optionally only the
+    anomalies. Scores and bounds become float32 and the anomaly flag int8, the
+    value column is kept as it is. Row counts and the given metadata ex.
+    threshold are kept in results.attrs.
+    Args:
+        results (Dataframe): detector results with ds, y and anomaly columns
+        anomalies_only (bool): keep only the anomalous rows
+        metadata: values stored in attrs ex. threshold or model name
+    Returns:
+        results (Dataframe): compact results
+    """
+    anomaly = results["anomaly"].to_numpy().astype(np.int8)
+    compact = results[anomaly == 1] if anomalies_only else results
+    compact = compact.reset_index(drop=True).astype(
+        {
+            column: np.float32
+            for column, dtype in compact.dtypes.items()
+            if column not in ("y", "actual")
+            and pd.api.types.is_float_dtype(dtype)
+        }
+    )
+    compact["anomaly"] = compact["anomaly"].astype(np.int8)
+    compact.attrs = dict(
+        results.attrs,
+        rows=len(results),
+        anomalies=int(anomaly.sum()),
+        **metadata
+    )
+    return compact
+
+
+def _compact(results, compact, **metadata):
+    """Applies the detectors' compact option, None, 'dense' or 'sparse'."""
+    if compact is None:
+        return results
+    if compact not in ("dense", "sparse"):
+        raise ValueError("compact must be None, 'dense' or 'sparse'")
+    return compact_results(
+        results, anomalies_only=compact == "sparse", **metadata
+    )
+
+
+class _PersistedModel:
+    """Save, load and retrain checks of the models that score new data."""
+
+    model = None
+
+    def _check_schema(self, features):
+        if self.model is None:
+            raise ValueError("The model is not fitted or loaded yet")
+        if _schema_hash(features) != self.schema_hash:
+            raise ValueError(
+                "Feature schema {0} does not match the model schema {1}"
+                .format(list(features.columns), self.features)
+            )
+
+    def save(self, path):
+        """Saves the fitted model with its feature schema.
+        Args:
+            path (str): file path of the model, ex. models/if_tr.joblib
+        Returns: None
+        """
+        try:
+            joblib.dump(
+                {
+                    "format_version": MODEL_FORMAT_VERSION,
+                    "model_class": type(self).__name__,
+                    "state": self.__dict__,
+                },
+                path,
+            )
+        except Exception as error:
+            raise Exception("Error when saving the model...") from error
+
+    def load(self, path):
+        """Loads a model saved with save.
+        Args:
+            path (str): file path of the model
+        Returns:
+            self: the model ready to score new data
+        """
+        try:
+            payload = joblib.load(path)
+        except Exception as error:
+            raise Exception("Error when loading the model...") from error
+        if payload.get("format_version") != MODEL_FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported model format version {0}".format(
+                    payload.get("format_version")
+                )
+            )
+        if payload.get("model_class") != type(self).__name__:
+            raise ValueError(
+                "{0} can not load a saved {1}".format(
+                    type(self).__name__, payload.get("model_class")
+                )
+            )
+        self.__dict__.update(payload["state"])
+        return self
+
+    def should_retrain(
+        self, df_model=None, max_age=None, anomaly_ratio_limit=None
+    ):
+        """Decides whether the model should be trained again.
+        Args:
+            df_model (Dataframe): newest model data, used for the drift check,
+                optional
+            max_age (str or Timedelta): retrain when the model is older than
+                that, ex. '7D'
+            anomaly_ratio_limit (float): retrain when the anomaly ratio on
+                df_model is above that value, ex. 2 * contamination
+        Returns:
+            retrain (bool)
+        """
+        if self.model is None:
+            return True
+        if (
+            max_age is not None
+            and pd.Timestamp.now() - self.trained_at > pd.Timedelta(max_age)
+        ):
+            return True
+        if df_model is not None and anomaly_ratio_limit is not None:
+            if self.predict(df_model)["anomaly"].mean() > anomaly_ratio_limit:
+                return True
+        return False
+
+
+class IsolationForestModel(_PersistedModel):
+    @instrumented("fit")
+    def fit(self, df_model, contamination_value=float(0.06)):
+        """Train a Isolation Forest model with given dataframe.
         Args:
             df_model (Dataframe): Dataframe ready to use train model
             contamination_value (float): It contains default float value for contamination parameter
         Returns:
-            df_model (Dataframe): The results of the anomaly forecasting
+            self: the fitted model
         """
         try:
-            df_columns = df_model.columns
-            model = IsolationForest(
+            _, features = _split_model_data(df_model)
+            self.model = IsolationForest(
                 n_estimators=100,
                 max_samples="auto",
                 contamination=contamination_value,
                 random_state=41,
+            ).fit(features)
+            self.features = list(features.columns)
+            self.schema_hash = _schema_hash(features)
+            self.contamination = contamination_value
+            self.trained_at = pd.Timestamp.now()
+            return self
+        except Exception as error:
+            raise Exception("Error when the IF model training...") from error
+
+    def score(self, df_model):
+        """Scores the data with the fitted model, lower scores are more
+        abnormal.
+        Args:
+            df_model (Dataframe): Dataframe with the same features as the
+                training data
+        Returns:
+            scores (np.ndarray): anomaly scores
+        """
+        _, features = _split_model_data(df_model)
+        self._check_schema(features)
+        return self.model.decision_function(features)
+
+    @instrumented("score")
+    def predict(self, df_model, compact=None):
+        """Detects anomalies of the data with the fitted model.
+        Args:
+            df_model (Dataframe): Dataframe with the same features as the
+                training data
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+        Returns:
+            df_model (Dataframe): The results of the anomaly forecasting
+        """
+        model_data, features = _split_model_data(df_model)
+        self._check_schema(features)
+        result = model_data[["ds", "y"]].reset_index(drop=True)
+        result["score"] = self.model.decision_function(features)
+        result["anomaly"] = (self.model.predict(features) == -1).astype(int)
+        return _compact(result, compact, model="IF", threshold=0.0,
+                        contamination=self.contamination)
+
+    def train_model(
+        self, df_model, contamination_value=float(0.06), compact=None
+    ):
+        """Train a Isolation Forest model and make prediction with given
+        dataframe.
+        Args:
+            df_model (Dataframe): Dataframe ready to use train model
+            contamination_value (float): It contains default float value for
+                contamination parameter
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+        Returns:
+            df_model (Dataframe): The results of the anomaly forecasting
+        """
+        try:
+            return self.fit(df_model, contamination_value).predict(
+                df_model, compact
             )
-            model.fit(df_model[df_columns])
-            df_model["score"] = model.decision_function(df_model[df_columns])
-            df_model["anomaly"] = model.predict(df_model[df_columns])
-            df_model["anomaly"][df_model["anomaly"] == 1] = 0
-            df_model["anomaly"][df_model["anomaly"] == -1] = 1
-            return df_model.reset_index()[["ds", "y", "score", "anomaly"]]
-        except Exception:
-            raise Exception("Error when the IF model training and prediction...")
+        except Exception as error:
+            raise Exception(
+                "Error when the IF model training and prediction..."
+            ) from error
+
+
+def _build_lof(contamination_value, n_neighbors, algorithm, leaf_size, n_jobs,
+               approximate, novelty):
+    """Builds a LOF estimator with the given neighbour backend.
+    Args:
+        approximate (bool): use a pynndescent approximate neighbour graph
+            instead of an exact search, the LOF then runs on the precomputed
+            graph
+    Returns:
+        estimator (LocalOutlierFactor or Pipeline), lof (LocalOutlierFactor)
+    """
+    if not approximate:
+        lof = LocalOutlierFactor(
+            n_neighbors=n_neighbors,
+            algorithm=algorithm,
+            leaf_size=leaf_size,
+            contamination=contamination_value,
+            novelty=novelty,
+            n_jobs=n_jobs,
+        )
+        return lof, lof
+    from pynndescent import PyNNDescentTransformer
+    from sklearn.pipeline import make_pipeline
+
+    lof = LocalOutlierFactor(
+        n_neighbors=n_neighbors,
+        metric="precomputed",
+        contamination=contamination_value,
+        novelty=novelty,
+        n_jobs=n_jobs,
+    )
+    transformer = PyNNDescentTransformer(
+        n_neighbors=n_neighbors, n_jobs=n_jobs if n_jobs is not None else 1
+    )
+    return make_pipeline(transformer, lof), lof
+
 
+class LocalOutlierFactorModel(_PersistedModel):
+    @instrumented("fit")
+    def fit(self, df_model, contamination_value=float(0.06), n_neighbors=20,
+            algorithm="auto", leaf_size=30, n_jobs=None, approximate=False):
+        """Train a Local Outlier Factor model in novelty mode, so new buckets
+        can be scored against the stored neighbour index without recomputing
+        LOF for the whole history.
+        Args:
+            df_model (Dataframe): Dataframe ready to use train model
+            contamination_value (float): It contains default float value for
+                contamination parameter
+            n_neighbors (int): number of neighbours of the local density
+            algorithm (str): exact neighbour search, 'auto', 'ball_tree',
+                'kd_tree' or 'brute'
+            leaf_size (int): leaf size of the ball or kd tree
+            n_jobs (int): number of parallel jobs of the neighbour queries, -1
+                uses all cores
+            approximate (bool): use a pynndescent approximate neighbour index
+        Returns:
+            self: the fitted model
+        """
+        try:
+            _, features = _split_model_data(df_model)
+            self.model, lof = _build_lof(contamination_value, n_neighbors,
+                                         algorithm, leaf_size, n_jobs,
+                                         approximate, novelty=True)
+            self.model.fit(features)
+            self.training_scores = lof.negative_outlier_factor_ - lof.offset_
+            self.features = list(features.columns)
+            self.schema_hash = _schema_hash(features)
+            self.contamination = contamination_value
+            self.trained_at = pd.Timestamp.now()
+            return self
+        except Exception as error:
+            raise Exception("Error when the LOF model training...") from error
 
-class LocalOutlierFactorModel:
-    def train_model(self, df_model, contamination_value=float(0.06)):
+    def score(self, df_model):
+        """Scores new data against the stored neighbours, lower scores are more
+        abnormal.
+        Args:
+            df_model (Dataframe): Dataframe with the same features as the
+                training data
+        Returns:
+            scores (np.ndarray): anomaly scores, negative for anomalies
+        """
+        _, features = _split_model_data(df_model)
+        self._check_schema(features)
+        return self.model.decision_function(features)
+
+    @instrumented("score")
+    def predict(self, df_model, compact=None):
+        """Detects anomalies of new data with the fitted model.
+        Args:
+            df_model (Dataframe): Dataframe with the same features as the
+                training data
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+        Returns:
+            df_model (Dataframe): The results of the anomaly forecasting
+        """
+        model_data, features = _split_model_data(df_model)
+        self._check_schema(features)
+        result = model_data[["ds", "y"]].reset_index(drop=True)
+        result["score"] = self.model.decision_function(features)
+        result["anomaly"] = (result["score"] < 0).astype(int)
+        return _compact(result, compact, model="LOF", threshold=0.0,
+                        contamination=self.contamination)
+
+    def train_model(self, df_model, contamination_value=float(0.06),
+                    compact=None, n_neighbors=20, algorithm="auto",
+                    leaf_size=30, n_jobs=None, approximate=False,
+                    novelty=False):
         """Train a Local Outlier Factor model and make prediction with given dataframe.
         Args:
             df_model (Dataframe): Dataframe ready to use train model
             contamination_value (float): It contains default float value for contamination parameter
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+            n_neighbors, algorithm, leaf_size, n_jobs, approximate: neighbour
+                backend, see fit
+            novelty (bool): keep the fitted model, so predict can score new
+                buckets later
         Returns:
             df_model (Dataframe): The results of the anomaly forecasting
         """
         try:
-            # building model object
-            model = LocalOutlierFactor(contamination=contamination_value)
-            # model fitting and prediction
-            df_model["anomaly"] = model.fit_predict(df_model)
-            df_model["anomaly"][df_model["anomaly"] == 1] = 0
-            df_model["anomaly"][df_model["anomaly"] == -1] = 1
-            return df_model.reset_index()[["ds", "y", "anomaly"]]
-        except Exception:
-            raise Exception("Error when the LOF model training and prediction...")
+            model_data, features = _split_model_data(df_model)
+            result = model_data[["ds", "y"]].reset_index(drop=True)
+            if novelty:
+                self.fit(df_model, contamination_value, n_neighbors, algorithm,
+                         leaf_size, n_jobs, approximate)
+                result["score"] = self.training_scores
+                result["anomaly"] = (self.training_scores < 0).astype(int)
+            else:
+                result["anomaly"] = self._fit_predict(
+                    features, contamination_value, n_neighbors, algorithm,
+                    leaf_size, n_jobs, approximate,
+                )
+            return _compact(result, compact, model="LOF",
+                            contamination=contamination_value)
+        except Exception as error:
+            raise Exception(
+                "Error when the LOF model training and prediction..."
+            ) from error
+
+    @instrumented("fit")
+    def _fit_predict(self, features, contamination_value, n_neighbors,
+                     algorithm, leaf_size, n_jobs, approximate):
+        model, _ = _build_lof(contamination_value, n_neighbors, algorithm,
+                              leaf_size, n_jobs, approximate, novelty=False)
+        return (model.fit_predict(features) == -1).astype(int)
+
+
+def _warm_start_params(model):
+    """Returns the fitted parameters of a prophet model as initial values of a
+    new fit.
+    Args:
+        model (Prophet): fitted prophet model
+    Returns:
+        params (dict): k, m, sigma_obs, delta and beta values
+    """
+    params = {}
+    for name in ["k", "m", "sigma_obs"]:
+        if model.mcmc_samples == 0:
+            params[name] = model.params[name][0][0]
+        else:
+            params[name] = np.mean(model.params[name])
+    for name in ["delta", "beta"]:
+        if model.mcmc_samples == 0:
+            params[name] = model.params[name][0]
+        else:
+            params[name] = np.mean(model.params[name], axis=0)
+    return params
+
+
+def _fit_prophet(
+    df_model, uncertainty_samples=1000, mcmc_samples=0, init_params=None
+):
+    """Fits a prophet model and predicts the training data.
+    Args:
+        df_model (Dataframe): Two column dataframe ready to use train model
+        uncertainty_samples (int): number of samples of the uncertainty
+            intervals
+        mcmc_samples (int): 0 fits MAP estimates only
+        init_params (dict): initial parameters from _warm_start_params,
+            optional
+    Returns:
+        model (Prophet), forecast (Dataframe)
+    """
+    from prophet import Prophet
+
+    for logger_name in ["cmdstanpy", "prophet"]:
+        logging.getLogger(logger_name).setLevel(logging.WARNING)
+    model = Prophet(
+        uncertainty_samples=uncertainty_samples, mcmc_samples=mcmc_samples
+    )
+    if init_params is None:
+        model = model.fit(df_model)
+    else:
+        model = model.fit(df_model, init=init_params)
+    forecast = model.predict(df_model)
+    forecast["actual"] = df_model["y"].reset_index(drop=True)
+    return model, forecast
+
+
+def _fit_prophet_series(
+    key, df_model, uncertainty_samples, mcmc_samples, init_params
+):
+    """Fits the prophet model of one series in a process pool worker.
+    Returns:
+        key, forecast (Dataframe) or None, model json (str) or None and error
+        message or None
+    """
+    try:
+        from prophet.serialize import model_to_json
+
+        model, forecast = _fit_prophet(
+            df_model, uncertainty_samples, mcmc_samples, init_params
+        )
+        return key, forecast, model_to_json(model), None
+    except Exception as error:
+        return key, None, None, "{0}: {1}".format(type(error).__name__, error)
 
 
 class ProphetModel:
-    def train_model(self, df_model):
+    @instrumented("fit")
+    def train_model(
+        self,
+        df_model,
+        uncertainty_samples=1000,
+        mcmc_samples=0,
+        init_model=None,
+    ):
         """Train a Prophet model with given dataframe.
         Args:
             df_model (Dataframe): Two column dataframe ready to use train model
+            uncertainty_samples (int): number of samples of the uncertainty
+                intervals, lower values make prediction faster, get_anomalies
+                needs it above 0
+            mcmc_samples (int): 0 fits MAP estimates only
+            init_model (Prophet): previously fitted model of the same series
+                whose parameters are used as starting point of the fit,
+                optional
         Returns:
             forecast (Dataframe): The results of the training
         """
         try:
-            # define the model
-            m = Prophet()
-            # fit the model
-            m = m.fit(df_model)
-            # use the model to find an outlier
-            forecast = m.predict(df_model)
-            forecast["actual"] = df_model["y"].reset_index(drop=True)
+            init_params = None
+            if init_model is not None:
+                init_params = _warm_start_params(init_model)
+            self.model, forecast = _fit_prophet(
+                df_model, uncertainty_samples, mcmc_samples, init_params
+            )
             return forecast
-        except Exception:
-            raise Exception("Error when the prophet model training...")
+        except Exception as error:
+            raise Exception(
+                "Error when the prophet model training..."
+            ) from error
+
+    def train_many(
+        self,
+        series_models,
+        n_jobs=1,
+        uncertainty_samples=1000,
+        mcmc_samples=0,
+        init_models=None,
+    ):
+        """Train Prophet models of many series on a process pool.
+        Args:
+            series_models (dict): series key vs two column dataframe ready to
+                use train model
+            n_jobs (int): number of series fitted in parallel
+            uncertainty_samples (int): number of samples of the uncertainty
+                intervals
+            mcmc_samples (int): 0 fits MAP estimates only
+            init_models (dict): series key vs previously fitted Prophet model
+                used to warm start the fit, ex. the models attribute of an
+                earlier run, optional
+        Returns:
+            forecasts (dict): series key vs results of the training
+            errors (dict): series key vs error message of the failed series
+        """
+        try:
+            init_models = init_models or {}
+            tasks = [
+                (
+                    key,
+                    df_model,
+                    uncertainty_samples,
+                    mcmc_samples,
+                    (
+                        _warm_start_params(init_models[key])
+                        if key in init_models
+                        else None
+                    ),
+                )
+                for key, df_model in series_models.items()
+            ]
+            if n_jobs > 1 and tasks:
+                with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                    outputs = list(
+                        executor.map(_fit_prophet_series, *zip(*tasks))
+                    )
+            else:
+                outputs = [_fit_prophet_series(*task) for task in tasks]
+            from prophet.serialize import model_from_json
 
-    def train_forecast(self, forecast, bound_coefficient):
+            forecasts, errors = {}, {}
+            self.models = {}
+            for key, forecast, model_json, error in outputs:
+                if error is not None:
+                    errors[key] = error
+                    continue
+                forecasts[key] = forecast
+                self.models[key] = model_from_json(model_json)
+            return forecasts, errors
+        except Exception as error:
+            raise Exception(
+                "Error when training prophet models for all series..."
+            ) from error
+
+    def save_model(self, path, model=None):
+        """Saves a fitted prophet model as json.
+        Args:
+            path (str): file path of the model
+            model (Prophet): model to save, the last model of train_model when
+                not given
+        Returns: None
+        """
+        try:
+            from prophet.serialize import model_to_json
+
+            if model is None:
+                model = self.model
+            with open(path, "w") as file:
+                file.write(model_to_json(model))
+        except Exception as error:
+            raise Exception(
+                "Error when saving the prophet model..."
+            ) from error
+
+    def load_model(self, path):
+        """Loads a prophet model saved with save_model, ex. to pass as
+        init_model.
+        Args:
+            path (str): file path of the model
+        Returns:
+            model (Prophet): loaded model
+        """
+        try:
+            from prophet.serialize import model_from_json
+
+            with open(path, "r") as file:
+                return model_from_json(file.read())
+        except Exception as error:
+            raise Exception(
+                "Error when loading the prophet model..."
+            ) from error
+
+    def train_forecast(self, forecast, bound_coefficient, compact=None):
         """Tries to predict anomalies based on training results.
         Args:
             forecast (Dataframe): The results of the training
             bound_coefficient (float): optimization coefficient for anomaly number
+            compact (str): None, 'dense' or 'sparse', compact results drop
+                trend and yhat and keep the bounds as float32, 'sparse' keeps
+                only the anomalies
         Returns:
             forecasted (Dataframe): The results of the anomaly predidiction
         """
         try:
             forecasted = forecast[
                 ["ds", "trend", "yhat", "yhat_lower", "yhat_upper", "actual"]
-            ]
-
+            ].copy()
             forecasted["yhat_upper"] = forecasted["yhat_upper"] * bound_coefficient
             forecasted["yhat_lower"] = forecasted["yhat_lower"] / bound_coefficient
-            forecasted["anomaly"] = forecasted.apply(
-                lambda row: 1
-                if (row["actual"] < row["yhat_lower"])
-                | (row["actual"] > row["yhat_upper"])
-                else 0,
-                axis=1,
-            )
-            forecasted["anomaly"] = forecasted.apply(
-                lambda row: 1
-                if (row["actual"] < row["yhat_lower"])
-                | (row["actual"] > row["yhat_upper"])
-                else 0,
-                axis=1,
-            )
+            forecasted["anomaly"] = (
+                (forecasted["actual"] < forecasted["yhat_lower"])
+                | (forecasted["actual"] > forecasted["yhat_upper"])
+            ).astype(int)
+            if compact is not None:
+                columns = ["ds", "actual", "yhat_lower", "yhat_upper",
+                           "anomaly"]
+                forecasted = _compact(forecasted[columns], compact,
+                                      model="Prophet", coeff=bound_coefficient)
             return forecasted
-        except Exception:
-            raise Exception("Error when predicting anomalies...")
+        except Exception as error:
+            raise Exception("Error when predicting anomalies...") from error
 
+    def sweep_bound_coefficients(self, forecast, bound_coefficients):
+        """Labels anomalies for every bound coefficient in a single pass.
+        Upper and lower bounds of all coefficients are built as one
+        (coefficients x rows) matrix and compared with the actual values at
+        once.
+        Args:
+            forecast (Dataframe): The results of the training
+            bound_coefficients (list(float)): optimization coefficients for
+                anomaly number
+        Returns:
+            anomaly_numbers (np.ndarray): Number of anomalies for each
+                coefficient
+            masks (np.ndarray): Boolean anomaly masks, one row for each
+                coefficient
+        """
+        try:
+            coeffs = np.asarray(bound_coefficients, dtype=float)[:, np.newaxis]
+            actual = forecast["actual"].to_numpy(dtype=float)
+            upper = forecast["yhat_upper"].to_numpy(dtype=float) * coeffs
+            lower = forecast["yhat_lower"].to_numpy(dtype=float) / coeffs
+            masks = (actual < lower) | (actual > upper)
+            return masks.sum(axis=1), masks
+        except Exception as error:
+            raise Exception(
+                "Error when sweeping bound coefficients..."
+            ) from error
+
+    @instrumented("score")
     def get_anomalies(self, model_result, anomaly_number_level="Low"):
         """Tries to predict anomalies based on number level for each coefficients.
         Args:
@@ -117,32 +695,44 @@ class ProphetModel:
             anomaly_number_level (str): detected total anomaly number, high or low
         Returns:
             anomaly_table (Dataframe): Anomaly numbers vs coefficients in dataframe
-            anomaly_results (dict): Anomalies vs to coefficient values
+            anomaly_results (dict): Dates, actual values, coefficients and
+                boolean anomaly masks of the coefficient sweep
         """
-        number_of_anomalies = []
-        anomaly_results = {}
         bound_coefficients = {
             "High": [1.0, 0.9, 0.8, 0.7, 0.6],
             "Low": [1.0, 1.1, 1.2, 1.3, 1.4],
         }
         try:
-            for coeff in bound_coefficients[anomaly_number_level]:
-                forecast_result = self.train_forecast(model_result, coeff)
-                anomalies = forecast_result[forecast_result["anomaly"] == 1]
-                number_of_anomalies.append([coeff, len(anomalies)])
-                anomaly_results["{0}_anomaly_result".format(coeff)] = forecast_result
+            coeffs = bound_coefficients[anomaly_number_level]
+            anomaly_numbers, masks = self.sweep_bound_coefficients(
+                model_result, coeffs
+            )
+            anomaly_results = {
+                "ds": model_result["ds"].reset_index(drop=True),
+                "actual": model_result["actual"].reset_index(drop=True),
+                "coeff": coeffs,
+                "masks": masks,
+            }
             return (
-                pd.DataFrame(number_of_anomalies, columns=["coeff", "anomaly_number"]),
+                pd.DataFrame(
+                    {"coeff": coeffs, "anomaly_number": anomaly_numbers},
+                    columns=["coeff", "anomaly_number"],
+                ),
                 anomaly_results,
             )
-        except Exception:
-            raise Exception("Error when predicting anomalies for each coeffcients...")
+        except Exception as error:
+            raise Exception(
+                "Error when predicting anomalies for each coeffcients..."
+            ) from error
 
-    def find_optimum_anomalies(self, anomaly_table, results):
+    def find_optimum_anomalies(self, anomaly_table, results, compact=None):
         """Tries to find best coefficient for getting optimum anomalies.
         Args:
             anomaly_table (Dataframe): Anomaly numbers vs coefficients in dataframe
-            results (dict): Anomalies vs to coefficient values
+            results (dict): Anomaly masks of the coefficient sweep from
+                get_anomalies
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
         Returns:
             results (Dataframe): Detected optimum anomalies
         """
@@ -154,14 +744,86 @@ class ProphetModel:
             best_coeff = anomaly_table[
                 anomaly_table.slope == anomaly_table.slope.min()
             ]["coeff"].values[0]
-            return results["{0}_anomaly_result".format(best_coeff)][
-                ["ds", "actual", "anomaly"]
-            ].rename(columns={"actual": "y"})
-        except Exception:
-            raise Exception("Error when finding optimum anomalies...")
+            mask = results["masks"][list(results["coeff"]).index(best_coeff)]
+            return _compact(
+                pd.DataFrame(
+                    {
+                        "ds": results["ds"],
+                        "y": results["actual"],
+                        "anomaly": mask.astype(int),
+                    }
+                ),
+                compact, model="Prophet", coeff=float(best_coeff),
+            )
+        except Exception as error:
+            raise Exception(
+                "Error when finding optimum anomalies..."
+            ) from error
 
 
-class GaussianMixtureModel:
+class GaussianMixtureModel(_PersistedModel):
+    def fit(self, df_model, anomaly_percent=6, **sweep_kwargs):
+        """Finds the best gmm model for given dataframe and its anomaly
+        threshold.
+        Args:
+            df_model (Dataframe): dataframe ready to use train model
+            anomaly_percent (int): threshold value for number of detected
+                anomalies
+            sweep_kwargs: cluster_range, n_jobs, backend and patience of
+                get_all_models
+        Returns:
+            self: the fitted model
+        """
+        try:
+            bic_table, models = self.get_all_models(df_model, **sweep_kwargs)
+            model, model_data = self.find_best_model(bic_table, models)
+            features = model_data.drop("ds", axis=1)
+            self.model = model
+            self.features = list(features.columns)
+            self.schema_hash = _schema_hash(features)
+            self.threshold = self.get_threshold(
+                model, model_data, anomaly_percent
+            )
+            self.trained_at = pd.Timestamp.now()
+            return self
+        except Exception as error:
+            raise Exception("Error when fitting gmm model...") from error
+
+    def score(self, df_model):
+        """Scores the data with the fitted model, lower scores are more
+        abnormal.
+        Args:
+            df_model (Dataframe): Dataframe with the same features as the
+                training data
+        Returns:
+            scores (np.ndarray): log likelihood of each row
+        """
+        _, features = _split_model_data(df_model)
+        self._check_schema(features)
+        return self.model.score_samples(features)
+
+    def predict(self, df_model, compact=None):
+        """Detects anomalies of the data with the fitted model and its stored
+        threshold.
+        Args:
+            df_model (Dataframe): Dataframe with the same features as the
+                training data
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+        Returns:
+            anomaly_results (Dataframe): dataframe that contains anomaly
+                forecasting
+        """
+        model_data, features = _split_model_data(df_model)
+        self._check_schema(features)
+        return self.train_forecast(
+            self.model,
+            model_data.reset_index(drop=True),
+            None,
+            threshold=self.threshold,
+            compact=compact,
+        )
+
     def train_model(self, df_model, cluster_number, random_state=7):
         """Train a Gaussian Mixture model with given dataframe.
         Args:
@@ -178,28 +840,76 @@ class GaussianMixtureModel:
                 n_components=cluster_number, random_state=random_state
             )
             return df_model, model.fit(df_model.drop("ds", axis=1))
-        except Exception:
-            raise Exception("Error when training gmm model...")
+        except Exception as error:
+            raise Exception("Error when training gmm model...") from error
 
-    def get_all_models(self, data):
+    @instrumented("fit")
+    def get_all_models(
+        self,
+        data,
+        cluster_range=(1, 10),
+        n_jobs=1,
+        backend="process",
+        patience=None,
+    ):
         """Train a Gaussian Mixture model with different cluster number values.
+        Candidate fits are spread over a process or thread pool and only the
+        model with the lowest BIC is kept.
         Args:
             data (Dataframe): dataframe ready to use train model
+            cluster_range (tuple): start and stop of the candidate cluster
+                numbers
+            n_jobs (int): number of candidate models fitted in parallel
+            backend (str): pool type used when n_jobs > 1, process or thread
+            patience (int): stop the sweep when BIC has not improved for that
+                many consecutive cluster numbers, optional
         Returns:
             bic_table (Dataframe): cluster number vs bic value dataframe
-            all_models (dict): dictionary that contains all gmm models vs cluster number
+            all_models (dict): dictionary that contains the best gmm model vs
+                cluster number
         """
         try:
+            df = data.reset_index()
+            features = df.drop("ds", axis=1)
+            cluster_numbers = list(range(*cluster_range))
+            wave_size = max(int(n_jobs), 1)
             bic_values = []
-            all_models = {}
-            cluster_numbers = list(np.arange(1, 10))
-            for n in cluster_numbers:
-                df, model = self.train_model(data.copy(), n)
-                bic_values.append([n, round(model.bic(df.drop("ds", axis=1)), 4)])
-                all_models["{0}_trained_model".format(n)] = model, df
+            best = None
+            since_best = 0
+            executor = None
+            if wave_size > 1:
+                pool = {
+                    "process": ProcessPoolExecutor,
+                    "thread": ThreadPoolExecutor,
+                }
+                executor = pool[backend](max_workers=wave_size)
+            try:
+                for i in range(0, len(cluster_numbers), wave_size):
+                    wave = cluster_numbers[i:i + wave_size]
+                    if executor is None:
+                        fitted = [_fit_gmm(features, n) for n in wave]
+                    else:
+                        fitted = list(
+                            executor.map(
+                                _fit_gmm, [features] * len(wave), wave
+                            )
+                        )
+                    for n, model, bic in fitted:
+                        bic_values.append([n, round(bic, 4)])
+                        if best is None or bic < best[2]:
+                            best = n, model, bic
+                            since_best = 0
+                        else:
+                            since_best += 1
+                    if patience is not None and since_best >= patience:
+                        break
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            all_models = {"{0}_trained_model".format(best[0]): (best[1], df)}
             return pd.DataFrame(bic_values, columns=["cluster", "BIC"]), all_models
-        except Exception:
-            raise Exception("Error when getting all gmm models...")
+        except Exception as error:
+            raise Exception("Error when getting all gmm models...") from error
 
     def find_best_model(self, bic_table, models):
         """Find best gmm model wit respect to different cluster numbers.
@@ -215,24 +925,451 @@ class GaussianMixtureModel:
                 "cluster"
             ].values[0]
             return models["{0}_trained_model".format(best_cluster)]
-        except Exception:
-            raise Exception("Error when finding best gmm model...")
+        except Exception as error:
+            raise Exception("Error when finding best gmm model...") from error
+
+    def get_threshold(self, gmm_model, model_data, anomaly_percent):
+        """Computes the score threshold that marks anomalies for a gmm model.
+        Args:
+            gmm_model (model): detected best model
+            model_data (Dataframe): dataframe that used in modelling
+            anomaly_percent (int): threshold value for number of detected
+                anomalies
+        Returns:
+            threshold (float): scores below that value are anomalies
+        """
+        try:
+            scores = gmm_model.score_samples(model_data.drop("ds", axis=1))
+            return float(np.percentile(scores, anomaly_percent))
+        except Exception as error:
+            raise Exception(
+                "Error when computing anomaly threshold..."
+            ) from error
 
-    def train_forecast(self, gmm_model, model_data, anomaly_percent):
+    @instrumented("score")
+    def train_forecast(
+        self,
+        gmm_model,
+        model_data,
+        anomaly_percent,
+        threshold=None,
+        compact=None,
+    ):
         """Forecasting anomalies using found best gmm model.
         Args:
             gmm_model (model): detected best model
             model_data (Dataframe): dataframe that used in modelling
             anomaly_percent (int): threshold value for number of detected anomalies
+            threshold (float): precomputed score threshold, e.g. from
+                get_threshold on the history, optional. anomaly_percent is
+                ignored when it is given
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
         Returns:
             anomaly_results (Dataframe): dataframe that contains anomaly forecasting
         """
         try:
             scores = gmm_model.score_samples(model_data.drop("ds", axis=1))
+            if threshold is None:
+                threshold = np.percentile(scores, anomaly_percent)
             model_data["score"] = scores
-            model_data["anomaly"] = model_data["score"].apply(
-                lambda x: 1 if x < np.percentile(scores, anomaly_percent) else 0
+            model_data["anomaly"] = (scores < threshold).astype(int)
+            return _compact(
+                model_data[["ds", "y", "score", "anomaly"]],
+                compact,
+                model="GMM",
+                threshold=float(threshold),
+            )
+        except Exception as error:
+            raise Exception("Error when forecasting anomalies...") from error
+
+
+class StreamingModel:
+    def __init__(self, method="ewma", threshold=3.0, alpha=0.1, window=168,
+                 min_periods=24, refit_interval=24, contamination=0.02):
+        """Online anomaly detector that consumes one point or a micro-batch at
+        a time. The state of each series has a fixed size, so scoring a point
+        does not refit anything over the history.
+        Args:
+            method (str): ewma (EWMA control limits), mad (rolling robust
+                z-score) or inne (isolation nearest neighbour ensembles of the
+                window, read from a score grid that is refitted every
+                refit_interval)
+            threshold (float): absolute z-score above which a point is an
+                anomaly, not used by inne
+            alpha (float): smoothing factor of ewma
+            window (int): number of recent points kept by mad and inne
+            min_periods (int): number of points seen before anomalies are
+                reported
+            refit_interval (int): number of points between IsolationNNE refits
+                of inne
+            contamination (float): share of the window scored as anomalous by
+                inne, its threshold is the percentile of the window scores
+        """
+        if method not in ["ewma", "mad", "inne"]:
+            raise ValueError("Unknown streaming method: {0}".format(method))
+        self.method = method
+        self.threshold = threshold
+        self.alpha = alpha
+        self.window = window
+        self.min_periods = min_periods
+        self.refit_interval = refit_interval
+        self.contamination = contamination
+        self._rng = np.random.default_rng(41)
+        self._states = {}
+
+    def reset(self, series=None):
+        """Forgets the state of one series or of all series.
+        Args:
+            series: series key, all series when not given
+        Returns: None
+        """
+        if series is None:
+            self._states.clear()
+        else:
+            self._states.pop(series, None)
+
+    def update(self, ds, y, series=None):
+        """Scores one point and then adds it to the state of its series.
+        Args:
+            ds (datetime): time of the point
+            y (float): value of the point
+            series: series key, optional
+        Returns:
+            result (dict): ds, y, score and anomaly of the point
+        """
+        y = float(y)
+        if self.method == "ewma":
+            score, count = self._update_ewma(series, y)
+            anomaly = abs(score) > self.threshold
+        elif self.method == "mad":
+            score, count = self._update_mad(series, y)
+            anomaly = abs(score) > self.threshold
+        else:
+            score, count = self._update_inne(series, y)
+            anomaly = score < 0
+        if count <= self.min_periods:
+            anomaly = False
+        return {"ds": ds, "y": y, "score": score, "anomaly": int(anomaly)}
+
+    @instrumented("score")
+    def update_batch(self, df_model, series_column=None, compact=None):
+        """Scores a micro-batch point by point in time order.
+        Args:
+            df_model (Dataframe): dataframe with ds, y and optionally a series
+                key column
+            series_column (str): name of the series key column, optional
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+        Returns:
+            results (Dataframe): ds, y, score and anomaly of the points
+        """
+        try:
+            if series_column:
+                series = df_model[series_column].tolist()
+            else:
+                series = [None] * len(df_model)
+            rows = zip(df_model["ds"], df_model["y"], series)
+            results = pd.DataFrame(
+                [self.update(ds, y, key) for ds, y, key in rows],
+                columns=["ds", "y", "score", "anomaly"],
+            )
+            if series_column:
+                results.insert(0, series_column, series)
+            return _compact(
+                results, compact, model=self.method, threshold=self.threshold
+            )
+        except Exception as error:
+            raise Exception(
+                "Error when scoring the streaming batch..."
+            ) from error
+
+    def _update_ewma(self, series, y):
+        state = self._states.get(series)
+        if state is None:
+            self._states[series] = [1, y, 0.0]
+            return 0.0, 1
+        count, mean, var = state
+        diff = y - mean
+        score = diff / np.sqrt(var) if var > 0 else 0.0
+        increment = self.alpha * diff
+        state[0], state[1], state[2] = (
+            count + 1,
+            mean + increment,
+            (1 - self.alpha) * (var + diff * increment),
+        )
+        return score, count + 1
+
+    def _update_mad(self, series, y):
+        state = self._states.setdefault(series, deque(maxlen=self.window))
+        score = 0.0
+        if state:
+            values = np.fromiter(state, dtype=float, count=len(state))
+            median = np.median(values)
+            mad = np.median(np.abs(values - median))
+            if mad > 0:
+                score = 0.6745 * (y - median) / mad
+        state.append(y)
+        return score, len(state)
+
+    def _update_inne(self, series, y):
+        state = self._states.setdefault(
+            series,
+            {
+                "values": deque(maxlen=self.window),
+                "grid": None,
+                "since_fit": 0,
+            },
+        )
+        score = 0.0
+        if state["grid"] is not None:
+            # the score of a single value only depends on y, so it is read
+            # from the grid evaluated at the last refit
+            score = float(np.interp(y, state["grid"], state["scores"]))
+        state["values"].append(y)
+        state["since_fit"] += 1
+        if len(state["values"]) >= self.min_periods and (
+            state["grid"] is None or state["since_fit"] >= self.refit_interval
+        ):
+            self._refit_inne(state)
+        return score, len(state["values"])
+
+    def _refit_inne(self, state):
+        """Evaluates iNNE isolation scores of the window on a grid over its
+        range, shifted so scores below 0 are the contamination share of the
+        window.
+        """
+        values = np.fromiter(state["values"], dtype=float)
+        span = values.max() - values.min() or abs(values.mean()) or 1.0
+        grid = np.linspace(values.min() - span, values.max() + span, 256)
+        scores = _inne_scores(values, grid, self._rng)
+        threshold = np.percentile(
+            np.interp(values, grid, scores), 100 * self.contamination
+        )
+        state["grid"], state["scores"] = grid, scores - threshold
+        state["since_fit"] = 0
+
+
+def _inne_scores(values, points, rng, n_estimators=50, max_samples=16):
+    """Isolation using nearest neighbour ensembles (iNNE) of one dimensional
+    data, vectorized over all estimators.
+    Args:
+        values (np.ndarray): training values
+        points (np.ndarray): values to score
+        rng (np.random.Generator): random generator of the subsamples
+    Returns:
+        scores (np.ndarray): negative isolation scores, lower is more abnormal
+    """
+    size = min(max_samples, len(values))
+    order = np.argsort(rng.random((n_estimators, len(values))), axis=1)
+    centers = values[order[:, :size]]
+    distances = np.abs(centers[:, :, np.newaxis] - centers[:, np.newaxis, :])
+    distances[:, np.arange(size), np.arange(size)] = np.inf
+    radius = distances.min(axis=2)
+    neighbour_radius = np.take_along_axis(
+        radius, distances.argmin(axis=2), axis=1
+    )
+    ratio = 1 - np.divide(
+        neighbour_radius, radius, out=np.ones_like(radius), where=radius > 0
+    )
+    # the covering hypersphere with the smallest radius isolates the point,
+    # with the spheres sorted by radius that is the first covering one
+    order = radius.argsort(axis=1)
+    centers, radius, ratio = (
+        np.take_along_axis(array, order, axis=1)
+        for array in (centers, radius, ratio)
+    )
+    covered = (
+        np.abs(points[np.newaxis, np.newaxis, :] - centers[:, :, np.newaxis])
+        <= radius[:, :, np.newaxis]
+    )
+    best = covered.argmax(axis=1)
+    isolation = np.where(
+        np.take_along_axis(covered, best[:, np.newaxis, :], axis=1)[:, 0],
+        np.take_along_axis(ratio, best, axis=1),
+        1.0,
+    )
+    return -isolation.mean(axis=0)
+
+
+def _detect_series(key, df_series, model_name, time_column_name,
+                   value_column_name, date_type, model_kwargs, collect=None):
+    """Runs the detection pipeline of one series, module level so it can run
+    in a process pool. Errors are returned instead of raised to isolate each
+    series.
+    Args:
+        key: value of the series key column
+        df_series (Dataframe): raw rows of the series
+        model_name (str): name of the model, IF, LOF, Prophet or GMM
+        time_column_name (str): The column name will be defined time axis
+        value_column_name (str): The column name will be used as main data
+        date_type (str): data time range type, daily or hourly
+        model_kwargs (dict): keyword arguments of the model methods
+        collect (tuple): trace_memory and enabled of the parent
+            instrumentation, optional. When given, the stage records are
+            returned instead of exported, so a worker process can send them
+            back to the parent
+    Returns:
+        key, anomaly results (Dataframe) or None, error message (str) or None
+        and the collected stage records (list)
+    """
+    if collect is not None:
+        with collect_records(*collect) as records:
+            key, result, message, _ = _detect_series(
+                key, df_series, model_name, time_column_name,
+                value_column_name, date_type, model_kwargs,
+            )
+        return key, result, message, records
+    try:
+        with get_instrumentation().series(key):
+            return key, _run_series_model(
+                df_series, model_name, time_column_name, value_column_name,
+                date_type, model_kwargs
+            ), None, []
+    except Exception as error:
+        message = "{0}: {1}".format(type(error).__name__, error)
+        cause = error
+        while cause.__cause__ is not None:
+            cause = cause.__cause__
+        if cause is not error:
+            message += " ({0}: {1})".format(type(cause).__name__, cause)
+        return key, None, message, []
+
+
+def _run_series_model(
+    df_series,
+    model_name,
+    time_column_name,
+    value_column_name,
+    date_type,
+    model_kwargs,
+):
+    """Runs the transform, modeling data and model steps of one series.
+    Returns:
+        anomaly results (Dataframe)
+    """
+    features = Features()
+    df_model = features.get_modeling_data(
+        features.transform_data(
+            df_series, time_column_name, value_column_name
+        ),
+        model_name,
+        date_type,
+    )
+    if model_name == "IF":
+        return IsolationForestModel().train_model(df_model, **model_kwargs)
+    elif model_name == "LOF":
+        return LocalOutlierFactorModel().train_model(df_model, **model_kwargs)
+    elif model_name == "Prophet":
+        model = ProphetModel()
+        table, results = model.get_anomalies(
+            model.train_model(df_model),
+            model_kwargs.get("anomaly_number_level", "Low"),
+        )
+        return model.find_optimum_anomalies(table, results)
+    elif model_name == "GMM":
+        model = GaussianMixtureModel()
+        sweep_kwargs = {
+            k: v
+            for k, v in model_kwargs.items()
+            if k in ["cluster_range", "patience"]
+        }
+        table, models = model.get_all_models(df_model, **sweep_kwargs)
+        best_model, model_data = model.find_best_model(table, models)
+        return model.train_forecast(
+            best_model, model_data, model_kwargs.get("anomaly_percent", 6)
+        )
+    raise ValueError("Unknown model name: {0}".format(model_name))
+
+
+class BatchModel:
+    def __init__(
+        self, model_name, date_type="D", n_jobs=1, compact=None, **model_kwargs
+    ):
+        """Runs one of the models over many series of a long format dataframe.
+        Args:
+            model_name (str): name of the model, IF, LOF, Prophet or GMM
+            date_type (str): data time range type, daily or hourly
+            n_jobs (int): number of series processed in parallel by a process
+                pool
+            compact (str): None, 'dense' for small dtypes or 'sparse' for only
+                the anomalies
+            model_kwargs: keyword arguments of the model, ex.
+                contamination_value for IF and LOF, anomaly_number_level for
+                Prophet, anomaly_percent, cluster_range and patience for GMM
+        """
+        self.model_name = model_name
+        self.date_type = date_type
+        self.n_jobs = n_jobs
+        self.compact = compact
+        self.model_kwargs = model_kwargs
+
+    def train_model(
+        self, df, series_column, time_column_name, value_column_name
+    ):
+        """Groups the dataframe once by the series key and detects anomalies of
+        each series. A failing series is reported in errors and does not abort
+        the batch.
+        Args:
+            df (Dataframe): Long format dataframe that contains all series
+            series_column (str): The column name that identifies the series ex.
+                country
+            time_column_name (str): The column name will be defined time axis
+            value_column_name (str): The column name will be used as main data
+                to train
+        Returns:
+            results (Dataframe): Concatenated anomaly results with the series
+                key column
+            errors (dict): series key vs error message of the failed series
+        """
+        try:
+            columns = [time_column_name, value_column_name]
+            groups = [
+                (key, group[columns])
+                for key, group in df.groupby(series_column, sort=False)
+            ]
+            arguments = (
+                self.model_name,
+                time_column_name,
+                value_column_name,
+                self.date_type,
+                self.model_kwargs,
             )
-            return model_data[["ds", "y", "score", "anomaly"]]
-        except Exception:
-            raise Exception("Error when forecasting anomalies...")
\ No newline at end of file
+            instrumentation = get_instrumentation()
+            if self.n_jobs > 1:
+                # workers send their stage records back to this process
+                collect = (
+                    instrumentation.trace_memory,
+                    instrumentation.enabled,
+                )
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                    futures = [
+                        executor.submit(
+                            _detect_series, key, group, *arguments, collect
+                        )
+                        for key, group in groups
+                    ]
+                    outputs = [future.result() for future in futures]
+            else:
+                outputs = [
+                    _detect_series(key, group, *arguments)
+                    for key, group in groups
+                ]
+            results, errors = [], {}
+            for key, result, error, records in outputs:
+                for record in records:
+                    instrumentation.export(record)
+                if error is not None:
+                    errors[key] = error
+                    continue
+                result.insert(0, series_column, key)
+                results.append(result)
+            if not results:
+                return pd.DataFrame(columns=[series_column]), errors
+            results = pd.concat(results, ignore_index=True)
+            results = _compact(results, self.compact, model=self.model_name)
+            return results, errors
+        except Exception as error:
+            raise Exception(
+                "Error when training models for all series..."
+            ) from error
@@ -1,14 +1,94 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import json
-import requests
+import logging
 import pandas as pd
-import yagmail
+import smtplib
+import socket
+import threading
+import time
+from ..instrumentation.metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+_SMTP_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError,
+                           socket.timeout)
+
 
 class Email:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, username=None, password=None, host="smtp.gmail.com",
+                 port=None, **smtp_kwargs) -> None:
+        """ Keeps one SMTP session that is reused by every message.
+        Args:
+            username (str): The account to which the mail will sent from,
+                optional
+            password (str): The password to which the mail will sent from,
+                optional
+            host (str): SMTP server host, gmail by default
+            port (int): SMTP server port, optional
+            smtp_kwargs: other yagmail.SMTP arguments ex. smtp_ssl=False,
+                smtp_skip_login=True for a local SMTP server
+        """
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.smtp_kwargs = smtp_kwargs
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """ Opens and logs in the SMTP session if it is not open yet.
+        Returns:
+            smtp (yagmail.SMTP): The SMTP session
+        """
+        if self._smtp is None:
+            import yagmail
+
+            smtp = yagmail.SMTP(self.username, self.password, self.host,
+                                self.port, **self.smtp_kwargs)
+            smtp.login()
+            self._smtp = smtp
+        return self._smtp
 
+    def close(self):
+        """ Closes the SMTP session. """
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            finally:
+                self._smtp = None
+
+    def send(self, to_address, subject=None, content=None):
+        """ Send an email with the persistent SMTP session.
+        The message is sent on the logged in connection, which is opened
+        again once when the server has dropped it.
+        Args:
+            to_address (str): The account to which the mail will sent to
+            subject (str): The mail subject, optional
+            content (str): The mail content, optional
+        """
+        if content is None:
+            content = "Anomaly allert!.."
+        if subject is None:
+            subject = "Anomaly Detected"
+        with self._lock:
+            try:
+                self._sendmail(to_address, subject, content)
+            except _SMTP_CONNECTION_ERRORS:
+                self.close()
+                self._sendmail(to_address, subject, content)
+
+    def _sendmail(self, to_address, subject, content):
+        smtp = self.connect()
+        recipients, message = smtp.prepare_send(to_address, subject, content)
+        smtp.smtp.sendmail(smtp.user, recipients, message)
+
+    @instrumented("notify")
     def send_gmail(self, mygmailusername, mygmailpassword, to_gmail_address, subject=None, content=None):
         """ Send an email from gmail account to gmail account.
+        The SMTP session of the account is kept and reused by the next
+        messages.
         Args:
             mygmailusername (str): The account to which the mail will sent from
             mygmailpassword (str): The password to which the mail will sent from
@@ -16,46 +96,487 @@ class Email:
             subject (str): The mail subject, optional
             content (str): The mail content, optional
         """
+        account = (mygmailusername, mygmailpassword)
+        if account != (self.username, self.password):
+            self.close()
+            self.username, self.password = mygmailusername, mygmailpassword
         try:
-            yag = yagmail.SMTP(mygmailusername, mygmailpassword)
+            self.connect()
         except:
             print("The SMTP connection couldn't be successfull. Please check your gmail account settings.")
-
-        if content==None:
-            content = "Anomaly allert!.."
-        if subject==None:
-            subject = "Anomaly Detected"
+            return
         try:
-            yag.send(to_gmail_address, subject, content)
+            self.send(to_gmail_address, subject, content)
         except:
             print("Something went wrong when the email sending.")
 
+
 class Slack:
+    def __init__(self, timeout=10):
+        """ Keeps one HTTP keep-alive session that is reused by every
+        notification. Failed requests are not retried here, Notifier retries
+        them with backoff.
+        Args:
+            timeout (float): seconds to wait for the webhook
+        """
+        import requests
 
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, url, content=''):
+        """ Send a slack notification to channel with the persistent session.
+        Args:
+            url (str): The account access url
+            content (dict or str): The notification content, a plain text is
+                sent as message text
+        """
+        if content == '':
+            content = _default_slack_content()
+        elif isinstance(content, str):
+            content = {"username": "AnomalyDetectionBot", "text": content}
+        headers = {'Content-Type': "application/json"}
+        response = self.session.post(url, data=json.dumps(content),
+                                     headers=headers, timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception(response.status_code, response.text)
+
+    def close(self):
+        """ Closes the HTTP session. """
+        self.session.close()
+
+    @staticmethod
+    @instrumented("notify")
     def slack_notification(url, content=''):
         """ Send a slack notification to channel.
+        A shared keep-alive session with a timeout is used.
         Args:
             url (str): The account access url
             content (str): The notification content, optional
         """
-        if content=='':
-            content = {
-                "username": "AnomalyDetectionBot",
-                #"icon_emoji": ":robot_face:",
-                "attachments": [
+        global _shared_slack
+        if _shared_slack is None:
+            _shared_slack = Slack()
+        _shared_slack.send(url, content)
+
+
+_shared_slack = None
+
+
+def _default_slack_content():
+    return {
+        "username": "AnomalyDetectionBot",
+        #"icon_emoji": ":robot_face:",
+        "attachments": [
+            {
+                "color": "#1eb0e2",
+                "fields": [
                     {
-                        "color": "#1eb0e2",
-                        "fields": [
-                            {
 
-                                "short": "false",
-                            }
-                        ]
+                        "short": "false",
                     }
                 ]
             }
+        ]
+    }
 
-        headers = {'Content-Type': "application/json"}
-        response = requests.post(url, data=json.dumps(content), headers=headers)
-        if response.status_code != 200:
-            raise Exception(response.status_code, response.text)
\ No newline at end of file
+
+class EmailChannel:
+    def __init__(self, email, to_address):
+        """ Notifier channel that sends the messages as emails.
+        Args:
+            email (Email): Email object with the persistent SMTP session
+            to_address (str): The account to which the mails will sent to
+        """
+        self.email = email
+        self.to_address = to_address
+
+    def send(self, subject, content):
+        self.email.send(self.to_address, subject, content)
+
+
+class SlackChannel:
+    def __init__(self, slack, url):
+        """ Notifier channel that sends the messages to a slack webhook.
+        Args:
+            slack (Slack): Slack object with the persistent HTTP session
+            url (str): The account access url
+        """
+        self.slack = slack
+        self.url = url
+
+    def send(self, subject, content):
+        self.slack.send(self.url, "*{0}*\n{1}".format(subject, content))
+
+
+class _RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def __enter__(self):
+        self.lock.acquire()
+        wait = self.next_time - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.next_time = time.monotonic() + self.interval
+        self.lock.release()
+
+
+class _MemoryStateBackend:
+    def __init__(self, max_series, ttl):
+        self.max_series = max_series
+        self.ttl = ttl
+        self.states = OrderedDict()
+
+    def get(self, series):
+        item = self.states.get(series)
+        if item is None:
+            return None
+        state, updated_at = item
+        if self.ttl is not None and time.time() - updated_at > self.ttl:
+            del self.states[series]
+            return None
+        self.states.move_to_end(series)
+        return state
+
+    def set(self, series, state):
+        self.states[series] = (state, time.time())
+        self.states.move_to_end(series)
+        if len(self.states) > self.max_series:
+            self.states.popitem(last=False)
+
+    def open_series(self):
+        return [series for series, (state, _) in list(self.states.items())
+                if state[0] is not None and self.get(series) is not None]
+
+    def commit(self):
+        pass
+
+
+def _encode_series(series):
+    """ JSON text of a series key, tuples are written as arrays and numpy
+    scalars as their python value.
+    """
+    def default(value):
+        if hasattr(value, 'item'):
+            return value.item()
+        raise TypeError("Series key {0!r} can not be stored".format(value))
+
+    return json.dumps(series, default=default)
+
+
+def _decode_series(text):
+    """ Series key of _encode_series text, arrays are read as tuples. """
+    def to_key(value):
+        if isinstance(value, list):
+            return tuple(to_key(item) for item in value)
+        return value
+
+    return to_key(json.loads(text))
+
+
+class _SQLiteStateBackend:
+    def __init__(self, path, ttl):
+        import sqlite3
+
+        self.ttl = ttl
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS alert_state ("
+            "series TEXT PRIMARY KEY, incident_start TEXT, last_anomaly TEXT, "
+            "last_seen TEXT, updated_at REAL)")
+        if ttl is not None:
+            self.connection.execute(
+                "DELETE FROM alert_state WHERE updated_at < ?",
+                (time.time() - ttl,))
+        self.connection.commit()
+
+    def get(self, series):
+        row = self.connection.execute(
+            "SELECT incident_start, last_anomaly, last_seen, updated_at "
+            "FROM alert_state WHERE series = ?",
+            (_encode_series(series),)).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and time.time() - row[3] > self.ttl:
+            return None
+        return [pd.Timestamp(value) if value is not None else None
+                for value in row[:3]]
+
+    def set(self, series, state):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO alert_state VALUES (?, ?, ?, ?, ?)",
+            [_encode_series(series)]
+            + [value.isoformat() if value is not None else None
+               for value in state]
+            + [time.time()])
+
+    def open_series(self):
+        rows = self.connection.execute(
+            "SELECT series FROM alert_state WHERE incident_start IS NOT NULL")
+        keys = [_decode_series(row[0]) for row in rows.fetchall()]
+        return [series for series in keys if self.get(series) is not None]
+
+    def commit(self):
+        self.connection.commit()
+
+
+class AlertStateStore:
+    def __init__(self, path=None, freq="H", merge_gap=1, ttl=None,
+                 max_series=100000):
+        """ Remembers the open anomaly incident of every series, so only state
+        changes are sent. Anomalous buckets that are at most merge_gap buckets
+        apart are merged into one incident, buckets that were already seen are
+        ignored.
+        Args:
+            path (str): SQLite file that keeps the state between runs, in
+                memory when not given
+            freq (str): bucket length of the series ex. 'H' or 'D'
+            merge_gap (int): number of normal buckets after the last anomaly
+                that resolve an incident
+            ttl (float): seconds after which the state of a silent series is
+                forgotten, optional
+            max_series (int): number of series kept by the in memory store,
+                least recently used series are dropped first
+        """
+        bucket = pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+        self.gap = bucket * merge_gap
+        self._lock = threading.Lock()
+        if path is None:
+            self._backend = _MemoryStateBackend(max_series, ttl)
+        else:
+            self._backend = _SQLiteStateBackend(path, ttl)
+
+    def observe(self, series, ds, anomaly):
+        """ Adds one bucket of a series to its state.
+        Missing buckets are taken as normal, so an open incident whose last
+        anomaly is more than merge_gap buckets before ds is resolved first.
+        Args:
+            series: series key
+            ds (datetime): time of the bucket
+            anomaly (int or bool): whether the bucket is anomalous
+        Returns:
+            transitions (list(tuple)): (ds, transition) pairs, transition is
+                'opened' when a new incident starts and 'resolved' when the
+                open incident ends
+        """
+        with self._lock:
+            transitions = self._observe(series, pd.Timestamp(ds),
+                                        bool(anomaly))
+            self._backend.commit()
+        return transitions
+
+    def _observe(self, series, ds, anomaly):
+        state = self._backend.get(series)
+        if state is None:
+            state = (None, None, None)
+        incident_start, last_anomaly, last_seen = state
+        if last_seen is not None and ds <= last_seen:
+            return []
+        transitions = []
+        if incident_start is not None and ds - last_anomaly > self.gap:
+            transitions.append((last_anomaly + self.gap, "resolved"))
+            incident_start, last_anomaly = None, None
+        if anomaly:
+            if incident_start is None:
+                incident_start = ds
+                transitions.append((ds, "opened"))
+            last_anomaly = ds
+        elif incident_start is not None and ds - last_anomaly >= self.gap:
+            incident_start, last_anomaly = None, None
+            transitions.append((ds, "resolved"))
+        self._backend.set(series, [incident_start, last_anomaly, ds])
+        return transitions
+
+    def _resolve_until(self, until):
+        transitions = []
+        for series in self._backend.open_series():
+            incident_start, last_anomaly, last_seen = self._backend.get(series)
+            if until - last_anomaly >= self.gap:
+                self._backend.set(series, [None, None, last_seen])
+                transitions.append((series, last_anomaly + self.gap))
+        return transitions
+
+    def filter_results(self, results, series_column=None, series=None,
+                       until=None):
+        """ Adds the buckets of a detector result to the state and returns the
+        state changes.
+        Results that only keep the anomalous rows, ex. compact='sparse', need
+        until, so the incidents of series without new anomalies are resolved.
+        Args:
+            results (Dataframe): Dataframe with ds, y and anomaly columns
+            series_column (str): name of the series key column, optional
+            series: series key of all rows when there is no series key column,
+                optional
+            until (datetime): end of the period covered by the results, open
+                incidents without an anomaly in the last merge_gap buckets
+                before it are resolved, optional
+        Returns:
+            transitions (Dataframe): series, ds, y and transition of the state
+                changes, y is missing for the resolutions of missing buckets
+        """
+        results = results.sort_values("ds")
+        if series_column:
+            keys = results[series_column]
+        else:
+            keys = [series] * len(results)
+        transitions = []
+        with self._lock:
+            for key, ds, y, anomaly in zip(keys, results["ds"], results["y"],
+                                           results["anomaly"]):
+                ds = pd.Timestamp(ds)
+                for at, transition in self._observe(key, ds, bool(anomaly)):
+                    value = y if at == ds else float("nan")
+                    transitions.append([key, at, value, transition])
+            if until is not None:
+                for key, at in self._resolve_until(pd.Timestamp(until)):
+                    transitions.append([key, at, float("nan"), "resolved"])
+            self._backend.commit()
+        return pd.DataFrame(transitions,
+                            columns=["series", "ds", "y", "transition"])
+
+
+class Notifier:
+    def __init__(self, channels, max_workers=4, rate_limits=None, retries=3,
+                 backoff=1.0, state_store=None):
+        """ Dispatches alerts to many channels from a thread pool.
+        Alerts added during a run are coalesced into one digest message per
+        channel.
+        Args:
+            channels (dict): channel name vs object with a
+                send(subject, content) method, ex.
+                {'mail': EmailChannel(Email(...), 'team@x.com'),
+                 'slack': SlackChannel(Slack(), url)}
+            max_workers (int): number of messages sent in parallel
+            rate_limits (dict): channel name vs maximum messages per second,
+                optional
+            retries (int): number of retries of a failed message
+            backoff (float): seconds to wait before the first retry, doubled at
+                every retry
+            state_store (AlertStateStore): when given, add_results only adds
+                the incidents that were opened or resolved since the last run,
+                optional
+        """
+        self.channels = channels
+        self.retries = retries
+        self.backoff = backoff
+        self.state_store = state_store
+        rate_limits = rate_limits or {}
+        self._limiters = {name: _RateLimiter(rate_limits.get(name))
+                          for name in channels}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._alerts = []
+        self._lock = threading.Lock()
+
+    def add(self, series, ds, y, message=None):
+        """ Adds an alert to the digest of the run.
+        Args:
+            series: series key of the anomaly
+            ds (datetime): time of the anomaly
+            y (float): value of the anomaly
+            message (str): extra text of the alert, optional
+        """
+        with self._lock:
+            self._alerts.append(
+                {"series": series, "ds": ds, "y": y, "message": message})
+
+    def add_results(self, results, series_column=None, series=None,
+                    until=None):
+        """ Adds the anomalies of a detector result to the digest of the run.
+        Args:
+            results (Dataframe): Dataframe with ds, y and anomaly columns
+            series_column (str): name of the series key column, optional
+            series: series key of all rows when there is no series key column,
+                optional
+            until (datetime): end of the period covered by anomalies only
+                results, passed to the state store, optional
+        """
+        if self.state_store is not None:
+            transitions = self.state_store.filter_results(
+                results, series_column, series, until)
+            for key, ds, y, transition in transitions.itertuples(index=False):
+                self.add(key, ds, y, transition)
+            return
+        anomalies = results[results["anomaly"] == 1]
+        if series_column:
+            keys = anomalies[series_column]
+        else:
+            keys = [series] * len(anomalies)
+        for key, ds, y in zip(keys, anomalies["ds"], anomalies["y"]):
+            self.add(key, ds, y)
+
+    def build_digest(self, alerts):
+        """ Builds the subject and the content of the digest message.
+        Args:
+            alerts (list(dict)): alerts of the run
+        Returns:
+            subject (str), content (str)
+        """
+        series = {alert["series"] for alert in alerts}
+        subject = "Anomaly Detected: {0} alerts in {1} series".format(
+            len(alerts), len(series))
+        lines = []
+        alerts = sorted(alerts, key=lambda a: (str(a["series"]), str(a["ds"])))
+        for alert in alerts:
+            line = "{0} | {1} | {2}".format(alert["series"], alert["ds"],
+                                            alert["y"])
+            if alert["message"]:
+                line += " | {0}".format(alert["message"])
+            lines.append(line)
+        return subject, "\n".join(lines)
+
+    def send(self, subject, content, wait=True):
+        """ Sends a message to all channels in parallel.
+        Args:
+            subject (str): The message subject
+            content (str): The message content
+            wait (bool): wait for the messages, otherwise futures are returned
+        Returns:
+            results (dict): channel name vs None when sent or the last error
+        """
+        futures = {name: self._executor.submit(self._send_channel, name,
+                                               subject, content)
+                   for name in self.channels}
+        if not wait:
+            return futures
+        return {name: future.result() for name, future in futures.items()}
+
+    def flush(self, wait=True):
+        """ Sends the alerts added since the last flush as one digest per
+        channel.
+        Args:
+            wait (bool): wait for the messages, otherwise futures are returned
+        Returns:
+            results (dict): channel name vs None when sent or the last error,
+                empty without alerts
+        """
+        with self._lock:
+            alerts, self._alerts = self._alerts, []
+        if not alerts:
+            return {}
+        return self.send(*self.build_digest(alerts), wait=wait)
+
+    @instrumented("notify")
+    def _send_channel(self, name, subject, content):
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                with self._limiters[name]:
+                    self.channels[name].send(subject, content)
+                return None
+            except Exception as e:
+                error = e
+                logger.warning("Sending to %s failed (attempt %s): %s", name,
+                               attempt + 1, e)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        return error
+
+    def close(self):
+        """ Waits for the pending messages and stops the thread pool. """
+        self._executor.shutdown(wait=True)
@@ -1,43 +1,180 @@
-import plotly.graph_objects as go
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import os
+import re
+
+
+def _lttb_indices(x, y, max_points):
+    """ Largest triangle three buckets, keeps the points shaping the line. """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    indices = [0]
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            following = slice(end, edges[i + 2])
+            avg_x, avg_y = x[following].mean(), y[following].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices.append(a)
+    indices.append(n - 1)
+    return np.array(indices)
+
+
+def _minmax_indices(y, max_points):
+    """ Keeps the lowest and the highest point of every bucket. """
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+    indices = []
+    for bucket in np.array_split(np.arange(n), max_points // 2):
+        indices.append(bucket[np.argmin(y[bucket])])
+        indices.append(bucket[np.argmax(y[bucket])])
+    return np.unique(indices)
+
+
+def _downsample(df, time_column, value_column, max_points, downsample):
+    """ Reduces the normal points to max_points, anomalies are kept. """
+    if not max_points or len(df) <= max_points:
+        return df
+    df = df.sort_values(time_column)
+    y = df[value_column].to_numpy(dtype=float)
+    if downsample == "lttb":
+        times = df[time_column].to_numpy().astype("datetime64[ns]")
+        x = times.astype(np.int64).astype(float)
+        indices = _lttb_indices(x, y, max_points)
+    elif downsample == "minmax":
+        indices = _minmax_indices(y, max_points)
+    else:
+        raise ValueError("downsample must be 'lttb' or 'minmax'")
+    keep = np.zeros(len(df), dtype=bool)
+    keep[indices] = True
+    keep |= (df['anomaly'] == 1).to_numpy()
+    return df[keep]
+
+
+def _file_names(names):
+    """ Maps the series names to unique names that are safe as file names. """
+    file_names, used = {}, set()
+    for name in names:
+        base = re.sub(r"[^A-Za-z0-9._-]+", "_", str(name)).strip("._")
+        base = base or "series"
+        file_name, number = base, 1
+        while file_name.lower() in used:
+            number += 1
+            file_name = "{0}_{1}".format(base, number)
+        used.add(file_name.lower())
+        file_names[name] = file_name
+    return file_names
+
+
+def _export_graph(visualization, name, df, file_path, algorithm, options,
+                  file_format):
+    """ Writes the graph of one series, module level so it can run in a
+    process pool. Errors are returned instead of raised to isolate each
+    series.
+    Returns:
+        name, file path (str) or None, error message (str) or None
+    """
+    try:
+        fig = visualization.build_figure(
+            df, "{0} {1}".format(name, algorithm), *options)
+        if file_format == "html":
+            fig.write_html(file_path, include_plotlyjs="cdn")
+        else:
+            fig.write_image(file_path)
+        return name, file_path, None
+    except Exception as error:
+        return name, None, "{0}: {1}".format(type(error).__name__, error)
 
 
 class Anomaly_Visualization:
 
-    def line_graph(self, df, algorithm, time_column="ds", value_column="y", layout=None, save=False, path=None):
-        """It shows outliers on a time-series line graph as red marks
+    def build_figure(self, df, algorithm, time_column="ds", value_column="y",
+                     layout=None, render_mode="svg", max_points=None,
+                     downsample="lttb"):
+        """It builds the line graph figure of line_graph without showing or
+        saving it
         Args:
             df (Dataframe): It contains modeled dataframe
-            algorithm (str): name of the ML algorithm such as Isolation Forest, Prophet etc.
+            algorithm (str): name of the ML algorithm such as Isolation Forest,
+                Prophet etc.
             time_column (str): It represents column name of dates in dataset
             value_column (str): It represents counted value column's name
-            layout (dictionary): If you want to make setting on line-graph, you can add it with values you want.
+            layout (dictionary): If you want to make setting on line-graph, you
+                can add it with values you want.
+            render_mode (str): 'svg' or 'webgl', webgl draws large series much
+                faster
+            max_points (int): number of points the line is reduced to, anomaly
+                points are always kept
+            downsample (str): 'lttb' or 'minmax'
         Returns:
-            It returns a marked time-series line-graph.
+            fig (Figure): plotly figure
         """
+        import plotly.graph_objects as go
+
+        if render_mode == "svg":
+            trace = go.Scatter
+        elif render_mode == "webgl":
+            trace = go.Scattergl
+        else:
+            raise ValueError("render_mode must be 'svg' or 'webgl'")
         anomaly_points = df[df['anomaly'] == 1]
+        df = _downsample(df, time_column, value_column, max_points, downsample)
         # Plot the actuals points
-        actuals = go.Scatter(name='Actuals',
-                             x=df[time_column],
-                             y=df[value_column],
-                             mode='lines',
-                             marker=dict(size=12,
-                                         line=dict(width=1),
-                                         color="blue"))
+        actuals = trace(name='Actuals',
+                        x=df[time_column],
+                        y=df[value_column],
+                        mode='lines',
+                        marker=dict(size=12,
+                                    line=dict(width=1),
+                                    color="blue"))
         # Highlight the anomaly points
-        anomalies_map = go.Scatter(name="Anomaly",
-                                   showlegend=True,
-                                   x=anomaly_points[time_column],
-                                   y=anomaly_points[value_column],
-                                   mode='markers',
-                                   marker=dict(color="red",
-                                               size=11,
-                                               line=dict(
-                                                   color="red",
-                                                   width=2)))
+        anomalies_map = trace(name="Anomaly",
+                              showlegend=True,
+                              x=anomaly_points[time_column],
+                              y=anomaly_points[value_column],
+                              mode='markers',
+                              marker=dict(color="red",
+                                          size=11,
+                                          line=dict(
+                                              color="red",
+                                              width=2)))
         fig = go.Figure(data=[anomalies_map, actuals], layout=layout)
         fig.update_layout(
-            title_text='{0} Anomaly Detection Results'.format(algorithm), title_x=0.5)
+            title_text='{0} Anomaly Detection Results'.format(algorithm),
+            title_x=0.5)
+        return fig
+
+    def line_graph(self, df, algorithm, time_column="ds", value_column="y",
+                   layout=None, save=False, path=None, render_mode="svg",
+                   max_points=None, downsample="lttb", show=True):
+        """It shows outliers on a time-series line graph as red marks
+        Args:
+            df (Dataframe): It contains modeled dataframe
+            algorithm (str): name of the ML algorithm such as Isolation Forest,
+                Prophet etc.
+            time_column (str): It represents column name of dates in dataset
+            value_column (str): It represents counted value column's name
+            layout (dictionary): If you want to make setting on line-graph, you
+                can add it with values you want.
+            render_mode (str): 'svg' or 'webgl', webgl draws large series much
+                faster
+            max_points (int): number of points the line is reduced to, anomaly
+                points are always kept
+            downsample (str): 'lttb' or 'minmax'
+            show (bool): when False the figure is returned instead of shown
+        Returns:
+            It returns a marked time-series line-graph.
+        """
+        fig = self.build_figure(df, algorithm, time_column, value_column,
+                                layout, render_mode, max_points, downsample)
         if save:
             if path:
                 if not os.path.exists("{0}/plots".format(path)):
@@ -47,4 +184,53 @@ class Anomaly_Visualization:
                 if not os.path.exists("plots"):
                     os.mkdir("plots")
                 fig.write_image("plots/line_graph.png")
+        if not show:
+            return fig
         return fig.show()
+
+    def export_graphs(self, frames, algorithm, directory, time_column="ds",
+                      value_column="y", layout=None, render_mode="webgl",
+                      max_points=2000, downsample="lttb", file_format="html",
+                      n_jobs=4):
+        """It writes the line graphs of many series to a directory in parallel
+        processes without showing them. A failing series is reported in errors
+        and does not abort the batch.
+        Args:
+            frames (dict): series name vs modeled dataframe
+            algorithm (str): name of the ML algorithm such as Isolation Forest,
+                Prophet etc.
+            directory (str): directory the graphs are written to, created when
+                missing
+            file_format (str): 'html' or an image format such as 'png' or 'svg'
+            n_jobs (int): number of processes writing the graphs
+        Returns:
+            paths (dict): series name vs written file path, the file names are
+                the series names with other characters than letters, digits,
+                '.', '_' and '-' replaced by '_'
+            errors (dict): series name vs error message of the failed series
+        """
+        os.makedirs(directory, exist_ok=True)
+        file_names = _file_names(frames)
+        options = (time_column, value_column, layout, render_mode, max_points,
+                   downsample)
+        tasks = [
+            (self, name, df,
+             os.path.join(directory, "{0}.{1}".format(file_names[name],
+                                                      file_format)),
+             algorithm, options, file_format)
+            for name, df in frames.items()
+        ]
+        if n_jobs > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [executor.submit(_export_graph, *task)
+                           for task in tasks]
+                outputs = [future.result() for future in futures]
+        else:
+            outputs = [_export_graph(*task) for task in tasks]
+        paths, errors = {}, {}
+        for name, file_path, error in outputs:
+            if error is not None:
+                errors[name] = error
+            else:
+                paths[name] = file_path
+        return paths, errors
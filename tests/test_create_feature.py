@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from pyfbad.features.create_feature import Features
+
+
+def _raw(start, periods, tz="UTC"):
+    return pd.DataFrame({
+        "ds": pd.date_range(start, periods=periods, freq="30min", tz=tz),
+        "y": 1,
+    })
+
+
+@pytest.mark.parametrize("cache_name", ["buckets", "buckets.feather"])
+def test_incremental_resample_of_timezone_aware_data(tmp_path, cache_name):
+    cache_path = str(tmp_path / cache_name)
+    features = Features()
+    features.get_modeling_data(_raw("2021-01-01", 10), "IF", "H",
+                               cache_path=cache_path)
+    watermark = features.get_resample_watermark(cache_path, "H", "UTC")
+    assert watermark == pd.Timestamp("2021-01-01 04:00", tz="UTC")
+    df_model = features.get_modeling_data(
+        _raw("2021-01-01 04:00", 10), "IF", "H", cache_path=cache_path)
+    expected = features.get_modeling_data(
+        _raw("2021-01-01", 18), "IF", "H").reset_index()
+    pd.testing.assert_frame_equal(df_model.reset_index(), expected,
+                                  check_freq=False)
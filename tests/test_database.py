@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from pyfbad.data.database import SQLDB
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine("sqlite:///{0}".format(tmp_path / "results.db"))
+
+
+def _results(values, start="2021-01-01"):
+    return pd.DataFrame({
+        "series": ["TR"] * len(values),
+        "ds": pd.date_range(start, periods=len(values), freq="D"),
+        "y": values,
+        "anomaly": [0] * len(values),
+    })
+
+
+def _rows(engine, table_name):
+    with engine.connect() as conn:
+        return pd.read_sql(text("SELECT * FROM {0}".format(table_name)), conn)
+
+
+def test_default_method_keeps_the_index(engine):
+    SQLDB().writing_to_db(_results([1, 2]), engine.connect(), "results")
+    assert "index" in _rows(engine, "results").columns
+
+
+@pytest.mark.parametrize("method", ["multi", "upsert"])
+def test_bulk_methods_do_not_write_the_index(engine, method):
+    stats = SQLDB().writing_to_db(_results(list(range(500))),
+                                  engine.connect(), "results", method=method)
+    rows = _rows(engine, "results")
+    assert stats["rows"] == len(rows) == 500
+    assert "index" not in rows.columns
+
+
+def test_upsert_creates_the_unique_key_and_updates_rows(engine):
+    db = SQLDB()
+    db.writing_to_db(_results([1, 2, 3]), engine.connect(), "results",
+                     method="upsert")
+    db.writing_to_db(_results([20, 30, 40], start="2021-01-02"),
+                     engine.connect(), "results", method="upsert")
+    rows = _rows(engine, "results").sort_values("ds")
+    assert rows["y"].tolist() == [1, 20, 30, 40]
+    indexes = inspect(engine).get_indexes("results")
+    assert any(index["unique"] for index in indexes)
+
+
+def test_upsert_into_a_table_with_a_unique_key(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE results (series TEXT, ds TIMESTAMP, y INTEGER, "
+            "anomaly INTEGER, UNIQUE (series, ds))"))
+    db = SQLDB()
+    for values in ([1, 2], [5, 6]):
+        db.writing_to_db(_results(values), engine.connect(), "results",
+                         method="upsert")
+    assert _rows(engine, "results")["y"].tolist() == [5, 6]
+
+
+def test_upsert_with_only_key_columns(engine):
+    keys = _results([1, 2])[["series", "ds"]]
+    for _ in range(2):
+        SQLDB().writing_to_db(keys, engine.connect(), "results",
+                              method="upsert")
+    assert len(_rows(engine, "results")) == 2
+
+
+def test_copy_is_rejected_before_writing_on_other_dialects(engine):
+    with pytest.raises(ValueError):
+        SQLDB().writing_to_db(_results([1, 2]), engine.connect(), "results",
+                              method="copy")
+    assert not inspect(engine).has_table("results")
@@ -0,0 +1,16 @@
+import pandas as pd
+
+from pyfbad.notification.notifications import AlertStateStore
+
+
+def test_sqlite_state_resolves_with_the_observed_keys(tmp_path):
+    path = str(tmp_path / "state.db")
+    ds = pd.Timestamp("2021-01-01")
+    keys = [7, "7", ("TR", "ios")]
+    for key in keys:
+        assert AlertStateStore(path).observe(key, ds, 1) == [(ds, "opened")]
+    results = pd.DataFrame(columns=["ds", "y", "anomaly"])
+    resolved = AlertStateStore(path).filter_results(
+        results, until=ds + pd.Timedelta("3H"))
+    assert resolved["transition"].eq("resolved").all()
+    assert sorted(resolved["series"], key=repr) == sorted(keys, key=repr)